@@ -0,0 +1,253 @@
+"""
+Benchmark pseudo Hilbert curve generation, lookups and image reordering.
+
+Every backend is timed on a matrix of region shapes and checked against a
+reference scan that walks each Block one cell at a time, as described in
+the paper, without the shared scan templates the backends use.  Results are
+written as JSON so runs of different versions can be compared.  Peak memory
+is measured with tracemalloc in the benchmarking process only, so memory
+used by worker processes isn't included.
+
+    python PseudoBenchmark.py --output bench.json
+    python PseudoBenchmark.py --quick
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import PseudoHilbert
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# (name, width, height)
+shapes = [('square 64', 64, 64),
+          ('square 256', 256, 256),
+          ('square 1024', 1024, 1024),
+          ('odd x odd small', 255, 253),
+          ('odd x even small', 255, 256),
+          ('odd x odd', 1001, 999),
+          ('odd x even', 1001, 1000),
+          ('even x odd', 1000, 1001),
+          ('wide', 8192, 5),
+          ('tall', 5, 8192),
+          ('aspect 100:1', 4000, 40),
+          ('large 11*270 x 11*190', 11 * 270, 11 * 190)]
+
+# Shapes small enough for a quick run
+quick_shapes = ['square 64', 'square 256', 'odd x odd small',
+                'odd x even small', 'wide', 'tall']
+
+lookup_count = 100000
+
+
+def measure(function):
+    """Run a function twice, once for wall time and once for memory.
+
+    Tracing allocations slows Python code down a lot, so the timed run is
+    not traced.
+
+    Args:
+        function (callable): Called with no arguments
+
+    Returns:
+        (tuple): The function's result, seconds taken and peak bytes
+                 allocated while tracing
+    """
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    del result
+
+    tracemalloc.start()
+    result = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def as_nested_lists(curve):
+    """Return a curve's tables as plain lists for comparison.
+
+    Args:
+        curve (PseudoHilbert.PseudoHilbert):
+
+    Returns:
+        (tuple): coordinate_to_index and index_to_coordinate as lists
+    """
+    if curve.backend == 'list':
+        return curve.coordinate_to_index, curve.index_to_coordinate
+    return (curve.coordinate_to_index.tolist(),
+            curve.index_to_coordinate.tolist())
+
+
+def reference_tables(width, height):
+    """Scan a curve one cell at a time with Block.generate_scan.
+
+    Args:
+        width (int): The width of the region
+        height (int): The height of the region
+
+    Returns:
+        (tuple): coordinate_to_index and index_to_coordinate as lists
+    """
+    curve = PseudoHilbert.PseudoHilbert(width, height, 'list',
+                                        build_tables=False)
+    index_to_coordinate = []
+    for block in curve.build_block_list():
+        index_to_coordinate.extend(block.generate_scan())
+
+    coordinate_to_index = [[None] * height for x in range(width)]
+    for index, (x, y) in enumerate(index_to_coordinate):
+        coordinate_to_index[x][y] = index
+    return coordinate_to_index, index_to_coordinate
+
+
+def backend_configurations():
+    """List the ways of building a curve that should be benchmarked.
+
+    Returns:
+        (list): (name, keyword arguments for PseudoHilbert) pairs
+    """
+    configurations = []
+    for backend in PseudoHilbert.PseudoHilbert.backends:
+        if backend == 'numpy' and np is None:
+            continue
+        configurations.append((backend, {'backend': backend}))
+    if np is not None:
+        configurations.append(('numpy workers=2',
+                               {'backend': 'numpy', 'workers': 2}))
+    return configurations
+
+
+def benchmark_shape(width, height, seed):
+    """Benchmark and verify every backend on one region shape.
+
+    Args:
+        width (int): The width of the region
+        height (int): The height of the region
+        seed (int): Seed for the random lookup positions
+
+    Returns:
+        (dict): Results for the shape
+    """
+    result = {'width': width, 'height': height, 'cells': width * height,
+              'construction': {}, 'lookup': {}, 'verified': {}}
+
+    reference = reference_tables(width, height)
+
+    for name, arguments in backend_configurations():
+        curve, seconds, peak = measure(
+            lambda: PseudoHilbert.PseudoHilbert(width, height, **arguments))
+        result['construction'][name] = {'seconds': seconds,
+                                        'peak_bytes': peak}
+        result['verified'][name] = as_nested_lists(curve) == reference
+        del curve
+
+    # Streaming never holds the tables
+    cells, seconds, peak = measure(
+        lambda: list(PseudoHilbert.PseudoHilbert.iter_coordinates(width,
+                                                                  height)))
+    result['construction']['iter_coordinates'] = {'seconds': seconds,
+                                                  'peak_bytes': peak}
+    result['verified']['iter_coordinates'] = cells == reference[1]
+    del cells
+
+    # Point lookups
+    generator = random.Random(seed)
+    xs = [generator.randrange(width) for i in range(lookup_count)]
+    ys = [generator.randrange(height) for i in range(lookup_count)]
+    table = reference[0]
+    start = time.perf_counter()
+    expected = [table[x][y] for x, y in zip(xs, ys)]
+    result['lookup']['table'] =\
+        (time.perf_counter() - start) / lookup_count
+
+    descriptor = PseudoHilbert.CurveDescriptor(width, height)
+    sample = min(lookup_count, 10000)
+    start = time.perf_counter()
+    found = [descriptor.index_of(x, y)
+             for x, y in zip(xs[:sample], ys[:sample])]
+    result['lookup']['descriptor'] = (time.perf_counter() - start) / sample
+    verified = found == expected[:sample]
+
+    if np is not None:
+        x_array = np.array(xs)
+        y_array = np.array(ys)
+        start = time.perf_counter()
+        found = descriptor.index_of_many(x_array, y_array)
+        result['lookup']['descriptor_many'] =\
+            (time.perf_counter() - start) / lookup_count
+        verified = verified and found.tolist() == expected
+
+        found_x, found_y = descriptor.coordinate_of_many(np.array(expected))
+        verified = (verified and found_x.tolist() == xs and
+                    found_y.tolist() == ys)
+    result['verified']['descriptor'] = verified
+
+    # End to end image reordering
+    if np is not None:
+        curve = PseudoHilbert.PseudoHilbert(width, height, 'numpy')
+        image = np.random.default_rng(seed).integers(
+            0, 256, (height, width, 3), np.uint8)
+        start = time.perf_counter()
+        sequence = curve.reorder(image)
+        restored = curve.restore(sequence)
+        result['reorder_seconds'] = time.perf_counter() - start
+        result['verified']['reorder'] = bool((restored == image).all())
+
+    return result
+
+
+def main(arguments=None):
+    """Run the benchmarks and write the results as JSON.
+
+    Args:
+        arguments (list): Command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--output', help='file to write, default stdout')
+    parser.add_argument('--quick', action='store_true',
+                        help='only benchmark the smaller shapes')
+    parser.add_argument('--shape', action='append',
+                        help='benchmark only this named shape, repeatable')
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args(arguments)
+
+    selected = options.shape or (quick_shapes if options.quick else None)
+    results = {'python': platform.python_version(),
+               'numpy': None if np is None else np.__version__,
+               'platform': platform.platform(),
+               'shapes': {}}
+    for name, width, height in shapes:
+        if selected is not None and name not in selected:
+            continue
+        print('benchmarking', name, file=sys.stderr)
+        results['shapes'][name] = benchmark_shape(width, height,
+                                                  options.seed)
+
+    failures = [(name, check) for name, result in results['shapes'].items()
+                for check, passed in result['verified'].items() if not passed]
+    results['all_verified'] = not failures
+
+    text = json.dumps(results, indent=2)
+    if options.output:
+        with open(options.output, 'w') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+    for name, check in failures:
+        print('MISMATCH', name, check, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -39,10 +39,34 @@ Coordinate system
 (x,y)
 unless specified otherwise, coordinates follow a (width, height) pattern
 """
+import argparse
 import math
+import mmap
+import multiprocessing
 import operator
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from enum import Enum, auto
-from itertools import accumulate
+from itertools import accumulate, chain, cycle, islice, repeat
+from queue import Empty
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional and only needed by the array backend
+    np = None
+
+try:
+    import resource
+except ImportError:  # Only used to report peak memory, not on Windows
+    resource = None
 
 
 class Direction(Enum):
@@ -61,6 +85,107 @@ class Parity(Enum):
     ODD = auto()
 
 
+class BuildStats:
+    """Record how long each phase of building a curve takes.
+
+    Pass an instance, or True for the defaults, as the stats argument of
+    PseudoHilbert.  Each finished phase is appended to phases as a dict with
+    the phase name, wall time in seconds, block count, cell count and, when
+    trace_memory is set, the tracemalloc peak in bytes during the phase.
+
+    Args:
+        trace_memory (bool): Trace allocations with tracemalloc.  This slows
+                             the build down considerably.
+        callback (callable): Called with each phase's dict as it finishes
+
+    Attributes:
+        phases (list): The recorded phases in the order they ran
+    """
+
+    def __init__(self, trace_memory=False, callback=None):
+        """Create an empty set of statistics.
+
+        Args:
+            trace_memory (bool): Trace allocations with tracemalloc
+            callback (callable): Called with each phase's dict as it finishes
+        """
+        self.trace_memory = trace_memory
+        self.callback = callback
+        self.phases = []
+        self.current_phase = None
+        self.started_tracing = False
+
+    def start(self):
+        """Start tracing memory if requested and not already tracing."""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def begin_phase(self, name, block_count, cell_count):
+        """Finish the current phase, if any, and start timing a new one.
+
+        Args:
+            name (str): Name of the phase
+            block_count (int): Number of blocks the phase works on
+            cell_count (int): Number of cells the phase works on
+        """
+        self.end_phase()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        self.current_phase = {'phase': name,
+                              'block_count': block_count,
+                              'cell_count': cell_count,
+                              'start': time.perf_counter()}
+
+    def end_phase(self):
+        """Finish timing the current phase."""
+        phase = self.current_phase
+        if phase is None:
+            return
+        self.current_phase = None
+        phase['seconds'] = time.perf_counter() - phase.pop('start')
+        if self.trace_memory:
+            phase['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        self.phases.append(phase)
+        if self.callback is not None:
+            self.callback(phase)
+
+    def finish(self):
+        """Finish the current phase and stop any tracing started here."""
+        self.end_phase()
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def total_seconds(self):
+        """Return the total time of the recorded phases.
+
+        Returns:
+            (float):
+        """
+        return sum(phase['seconds'] for phase in self.phases)
+
+
+class NoBuildStats:
+    """Stands in for BuildStats when statistics are disabled."""
+
+    def start(self):
+        """Do nothing."""
+
+    def begin_phase(self, name, block_count, cell_count):
+        """Do nothing."""
+
+    def end_phase(self):
+        """Do nothing."""
+
+    def finish(self):
+        """Do nothing."""
+
+
+# Shared by every curve built without statistics
+no_build_stats = NoBuildStats()
+
+
 class Block:
     """A Block is a region of cells to be scanned in a specific manner.
 
@@ -247,11 +372,32 @@ class Block:
         return new_block
 
     def scan(self):
+        """Return the cells of the Block in scan order.
+
+        The scan is the shared ScanTemplate for the Block's size and scan
+        type moved to the Block's position.
+
+        Returns
+            coordinates (list): A list of two element lists containing (x,y)
+                                coordinates
+        """
+        pairs = ScanTemplate.get(self.x_size, self.y_size,
+                                 self.scan_type).pairs
+        x_pos = self.x_pos
+        y_pos = self.y_pos
+        return [[x_pos + x, y_pos + y]
+                for x, y in zip(pairs[0::2], pairs[1::2])]
+
+    def generate_scan(self):
         """Determine how to scan the Block.
 
         If both sides are divisible by 4, do a further division. If not, go
         straight to a bidirectional raster scan.
 
+        This is the scan as described in the paper, one cell at a time.  It
+        doesn't use ScanTemplate, so it serves as an independent reference
+        for checking the faster scans.
+
         Returns
             coordinates (list): A list of two element lists containing (x,y)
                                 coordinates
@@ -259,36 +405,236 @@ class Block:
         coordinates = []
         if (self.x_size % 4 == 0 and
                 self.y_size % 4 == 0):
-            half_x_size = self.x_size // 2
-            half_y_size = self.y_size // 2
-
-            # Create the sub-blocks
-            sub_blocks = [Block(None, [], []),
-                          Block(None, [], []),
-                          Block(None, [], []),
-                          Block(None, [], [])]
-
-            # Set the parameters for the sub-blocks
-            for block_index in range(4):
-                sub_blocks[block_index].set_size(half_x_size, half_y_size)
-
-                sub_blocks[block_index].set_coordinates(
-                    self.x_pos +
-                    self.even_even_optimisation_path[
-                        self.scan_type][block_index][1] * half_x_size,
-                    self.y_pos +
-                    self.even_even_optimisation_path[
-                        self.scan_type][block_index][2] * half_y_size)
-
-                sub_blocks[block_index].scan_type =\
-                    self.even_even_optimisation_path[
-                        self.scan_type][block_index][0]
-                coordinates = coordinates +\
-                    sub_blocks[block_index].bidirectional_raster_scan()
+            for sub_block in self.sub_blocks():
+                coordinates.extend(sub_block.bidirectional_raster_scan())
         else:
             coordinates = self.bidirectional_raster_scan()
         return coordinates
 
+    def scan_into(self, out):
+        """Scan the Block into a preallocated NumPy array.
+
+        Produces the same cells as scan() but computes them with array
+        arithmetic instead of a loop over cells.
+
+        Args
+            out (numpy.ndarray): A contiguous (x_size * y_size, 2) integer
+                                 array, usually a slice of a larger output,
+                                 that receives the (x,y) coordinates
+        """
+        self.scan_cells_into(out, self.x_pos, self.y_pos,
+                             self.x_size, self.y_size, self.scan_type)
+
+    @classmethod
+    def scan_cells_into(cls, out, x_pos, y_pos, x_size, y_size, scan_type):
+        """Scan a block described by its attributes into an array.
+
+        The work behind scan_into, usable without creating a Block.  The
+        block's ScanTemplate is moved to its position.
+
+        Args
+            out (numpy.ndarray): A contiguous (x_size * y_size, 2) integer
+                                 array that receives the (x,y) coordinates
+            x_pos (int): x position of the bottom left corner
+            y_pos (int): y position of the bottom left corner
+            x_size (int): The width of the block
+            y_size (int): The height of the block
+            scan_type (int): The scan type of the block
+        """
+        template = ScanTemplate.get(x_size, y_size, scan_type)
+        np.add(template.coordinates(), (x_pos, y_pos), out=out,
+               casting='unsafe')
+
+    def sub_blocks(self):
+        """Return the four sub-blocks used to scan a block in four parts.
+
+        Only meaningful when both sides are divisible by 4, see scan.
+
+        Returns
+            sub_blocks (list): Four Blocks in scan order with size, position
+                               and scan type set
+        """
+        half_x_size = self.x_size // 2
+        half_y_size = self.y_size // 2
+        sub_blocks = []
+        for scan_type, x_offset, y_offset in\
+                self.even_even_optimisation_path[self.scan_type]:
+            sub_block = Block(None, [], [])
+            sub_block.set_size(half_x_size, half_y_size)
+            sub_block.set_coordinates(self.x_pos + x_offset * half_x_size,
+                                      self.y_pos + y_offset * half_y_size)
+            sub_block.scan_type = scan_type
+            sub_blocks.append(sub_block)
+        return sub_blocks
+
+    def cell_to_offset(self, x, y):
+        """Return how many cells into the scan of this Block a cell is.
+
+        Gives the same answer as scan().index([x, y]) without scanning.
+
+        Args
+            x (int): x coordinate of a cell inside the Block
+            y (int): y coordinate of a cell inside the Block
+
+        Returns
+            (int): The position of the cell in the Block's scan
+        """
+        if self.x_size % 4 == 0 and self.y_size % 4 == 0:
+            sub_block_cells = self.x_size * self.y_size // 4
+            for block_index, sub_block in enumerate(self.sub_blocks()):
+                if (sub_block.x_pos <= x < sub_block.x_pos + sub_block.x_size
+                        and sub_block.y_pos <= y <
+                        sub_block.y_pos + sub_block.y_size):
+                    return (block_index * sub_block_cells +
+                            sub_block.raster_cell_to_offset(x, y))
+        return self.raster_cell_to_offset(x, y)
+
+    def offset_to_cell(self, offset):
+        """Return the cell a given number of cells into the Block's scan.
+
+        Gives the same answer as scan()[offset] without scanning.
+
+        Args
+            offset (int): The position of the cell in the Block's scan
+
+        Returns
+            (list): A two element [x, y] coordinate
+        """
+        if self.x_size % 4 == 0 and self.y_size % 4 == 0:
+            sub_block_cells = self.x_size * self.y_size // 4
+            sub_block = self.sub_blocks()[offset // sub_block_cells]
+            return sub_block.raster_offset_to_cell(offset % sub_block_cells)
+        return self.raster_offset_to_cell(offset)
+
+    def window_ranges(self, x_start, y_start, x_stop, y_stop):
+        """Return the runs of the Block's scan that lie inside a window.
+
+        The window is half open, covering x_start <= x < x_stop and
+        y_start <= y < y_stop, and must overlap the Block.
+
+        Args
+            x_start (int): Left edge of the window
+            y_start (int): Bottom edge of the window
+            x_stop (int): One past the right edge of the window
+            y_stop (int): One past the top edge of the window
+
+        Returns
+            ranges (list): [start, stop) offsets into the Block's scan in
+                           increasing order
+        """
+        if self.x_size % 4 == 0 and self.y_size % 4 == 0:
+            sub_block_cells = self.x_size * self.y_size // 4
+            ranges = []
+            for block_index, sub_block in enumerate(self.sub_blocks()):
+                if (sub_block.x_pos < x_stop and
+                        x_start < sub_block.x_pos + sub_block.x_size and
+                        sub_block.y_pos < y_stop and
+                        y_start < sub_block.y_pos + sub_block.y_size):
+                    ranges.extend(
+                        [start + block_index * sub_block_cells,
+                         stop + block_index * sub_block_cells]
+                        for start, stop in sub_block.raster_window_ranges(
+                            x_start, y_start, x_stop, y_stop))
+            return ranges
+        return self.raster_window_ranges(x_start, y_start, x_stop, y_stop)
+
+    def raster_window_ranges(self, x_start, y_start, x_stop, y_stop):
+        """Return the runs of a bidirectional raster scan inside a window.
+
+        Each line of the scan crosses the window in one run.
+
+        Args
+            x_start (int): Left edge of the window
+            y_start (int): Bottom edge of the window
+            x_stop (int): One past the right edge of the window
+            y_stop (int): One past the top edge of the window
+
+        Returns
+            ranges (list): [start, stop) offsets into the raster scan in
+                           increasing order
+        """
+        x_low = max(x_start, self.x_pos)
+        x_high = min(x_stop, self.x_pos + self.x_size) - 1
+        y_low = max(y_start, self.y_pos)
+        y_high = min(y_stop, self.y_pos + self.y_size) - 1
+
+        # Lines run in y when scanning y first, otherwise in x
+        if self.scan_instructions[self.scan_type][2] == 0:
+            line_ends = [((x, y_low), (x, y_high))
+                         for x in range(x_low, x_high + 1)]
+        else:
+            line_ends = [((x_low, y), (x_high, y))
+                         for y in range(y_low, y_high + 1)]
+
+        ranges = []
+        for first_cell, last_cell in line_ends:
+            first_offset = self.raster_cell_to_offset(*first_cell)
+            last_offset = self.raster_cell_to_offset(*last_cell)
+            ranges.append([min(first_offset, last_offset),
+                           max(first_offset, last_offset) + 1])
+        ranges.sort()
+        return ranges
+
+    def raster_cell_to_offset(self, x, y):
+        """Invert bidirectional_raster_scan for a single cell.
+
+        Args
+            x (int): x coordinate of a cell inside the Block
+            y (int): y coordinate of a cell inside the Block
+
+        Returns
+            (int): The position of the cell in the bidirectional raster scan
+        """
+        instructions = self.scan_instructions[self.scan_type]
+
+        # Measure from the starting corner of the scan
+        x_step = x - self.x_pos
+        y_step = y - self.y_pos
+        if instructions[0] == 1:
+            x_step = self.x_size - 1 - x_step
+        if instructions[1] == 1:
+            y_step = self.y_size - 1 - y_step
+
+        primary_step, secondary_step = y_step, x_step
+        primary_size = self.y_size
+        if instructions[2] == 1:
+            primary_step, secondary_step, primary_size =\
+                x_step, y_step, self.x_size
+
+        # Every second line is scanned backwards
+        if secondary_step % 2 == 1:
+            primary_step = primary_size - 1 - primary_step
+        return secondary_step * primary_size + primary_step
+
+    def raster_offset_to_cell(self, offset):
+        """Return a single cell of bidirectional_raster_scan.
+
+        Args
+            offset (int): The position of the cell in the raster scan
+
+        Returns
+            (list): A two element [x, y] coordinate
+        """
+        instructions = self.scan_instructions[self.scan_type]
+
+        primary_size = self.y_size
+        if instructions[2] == 1:
+            primary_size = self.x_size
+        secondary_step, primary_step = divmod(offset, primary_size)
+
+        # Every second line is scanned backwards
+        if secondary_step % 2 == 1:
+            primary_step = primary_size - 1 - primary_step
+
+        x_step, y_step = secondary_step, primary_step
+        if instructions[2] == 1:
+            x_step, y_step = primary_step, secondary_step
+        if instructions[0] == 1:
+            x_step = self.x_size - 1 - x_step
+        if instructions[1] == 1:
+            y_step = self.y_size - 1 - y_step
+        return [self.x_pos + x_step, self.y_pos + y_step]
+
     def bidirectional_raster_scan(self):
         """Perform a bidirectional raster scan of a Block.
 
@@ -376,6 +722,317 @@ class Block:
         return coordinates
 
 
+class AxisPlan:
+    """How one side of a region is divided into blocks.
+
+    Every curve with the same side length and order divides that side the
+    same way, so plans are shared through AxisPlan.get.  The segments of one
+    order only come in two or three lengths, so PseudoHilbert.division is
+    called once per distinct length and order, see level_splits.  The block
+    lengths are then expanded from those splits a whole order at a time.
+
+    The shared plans are kept until they add up to more than max_blocks
+    blocks, then the least recently used ones are dropped.  A plan bigger
+    than the whole budget is returned without being kept.
+
+    Args:
+        length (int): The length of the side of the region
+        order (int): The order of the parent Hilbert curve
+
+    Attributes:
+        length (int):
+        order (int):
+        splits (tuple): See level_splits
+        divisions (array): 2 ** order block lengths from low to high
+                           coordinates
+        offsets (array): Position of each block along the side with the
+                         length appended
+    """
+
+    # The most blocks held by the shared plans
+    max_blocks = 1 << 20
+
+    plans = OrderedDict()
+    cached_blocks = 0
+    lock = threading.Lock()
+
+    def __init__(self, length, order):
+        """Divide a side into blocks.
+
+        Args:
+            length (int): The length of the side of the region
+            order (int): The order of the parent Hilbert curve
+        """
+        self.length = length
+        self.order = order
+        self.splits = self.level_splits(length, order)
+
+        divisions = array('q', [length])
+        for split in self.splits:
+            divisions = array('q', chain.from_iterable(
+                map(split.__getitem__, divisions)))
+        self.divisions = divisions
+        self.offsets = array('q', accumulate(divisions, initial=0))
+
+    @staticmethod
+    def level_splits(length, order):
+        """Split every distinct segment length of each order.
+
+        Args:
+            length (int): The length of the side of the region
+            order (int): The order of the parent Hilbert curve
+
+        Returns:
+            (tuple): For each order from the top down, a dict mapping the
+                     length of each segment to its (first, second) parts
+        """
+        splits = []
+        lengths = {length}
+        for order_count in range(order):
+            split = {segment: tuple(PseudoHilbert.division(segment))
+                     for segment in lengths}
+            splits.append(split)
+            lengths = {part for parts in split.values() for part in parts}
+        return tuple(splits)
+
+    @classmethod
+    def get(cls, length, order):
+        """Return the shared plan for a side length and order.
+
+        Args:
+            length (int): The length of the side of the region
+            order (int): The order of the parent Hilbert curve
+
+        Returns:
+            (AxisPlan):
+        """
+        key = (length, order)
+        with cls.lock:
+            if key in cls.plans:
+                cls.plans.move_to_end(key)
+                return cls.plans[key]
+
+        # Build outside the lock so other plans can be served meanwhile
+        plan = cls(length, order)
+        block_count = len(plan.divisions)
+
+        with cls.lock:
+            if key in cls.plans or block_count > cls.max_blocks:
+                return plan
+            cls.plans[key] = plan
+            AxisPlan.cached_blocks += block_count
+            while AxisPlan.cached_blocks > cls.max_blocks:
+                AxisPlan.cached_blocks -=\
+                    len(cls.plans.popitem(last=False)[1].divisions)
+        return plan
+
+
+class ScanTemplate:
+    """The scan of a block relative to its bottom left corner.
+
+    A region has only a few distinct block sizes along each side, so most
+    blocks share a size and scan type with many others.  Each combination is
+    scanned once, including the split of blocks with both sides divisible by
+    4 into four sub-blocks, and shared through ScanTemplate.get.  Scanning a
+    block is then a matter of adding its position to a template.
+
+    The shared templates are kept until they add up to more than max_cells
+    cells, then the least recently used ones are dropped.  A template bigger
+    than the whole budget is returned without being kept.
+
+    Args:
+        x_size (int): The width of the block
+        y_size (int): The height of the block
+        scan_type (int): See Block.scan_instructions
+
+    Attributes:
+        x_size (int):
+        y_size (int):
+        scan_type (int):
+        cell_count (int):
+        pairs (array): (x, y) offset of each cell in scan order as flat
+                       x, y pairs
+    """
+
+    # The most cells held by the shared templates
+    max_cells = 1 << 20
+
+    templates = OrderedDict()
+    cached_cells = 0
+    lock = threading.Lock()
+
+    def __init__(self, x_size, y_size, scan_type):
+        """Scan a block at the origin.
+
+        Args:
+            x_size (int): The width of the block
+            y_size (int): The height of the block
+            scan_type (int): See Block.scan_instructions
+        """
+        self.x_size = x_size
+        self.y_size = y_size
+        self.scan_type = scan_type
+        self.cell_count = x_size * y_size
+        self.pairs = array('q', [0]) * (2 * self.cell_count)
+
+        if x_size % 4 == 0 and y_size % 4 == 0:
+            half_x_size = x_size // 2
+            half_y_size = y_size // 2
+            sub_block_cells = half_x_size * half_y_size
+            for block_index, (sub_scan_type, x_offset, y_offset) in\
+                    enumerate(Block.even_even_optimisation_path[scan_type]):
+                self.raster_scan_pairs_into(
+                    block_index * sub_block_cells,
+                    x_offset * half_x_size, y_offset * half_y_size,
+                    half_x_size, half_y_size, sub_scan_type)
+        else:
+            self.raster_scan_pairs_into(0, 0, 0, x_size, y_size, scan_type)
+
+    @classmethod
+    def get(cls, x_size, y_size, scan_type):
+        """Return the shared template for a block size and scan type.
+
+        Args:
+            x_size (int): The width of the block
+            y_size (int): The height of the block
+            scan_type (int): See Block.scan_instructions
+
+        Returns:
+            (ScanTemplate):
+        """
+        key = (x_size, y_size, scan_type)
+        with cls.lock:
+            if key in cls.templates:
+                cls.templates.move_to_end(key)
+                return cls.templates[key]
+
+        # Build outside the lock so other templates can be served meanwhile
+        template = cls(x_size, y_size, scan_type)
+
+        with cls.lock:
+            if key in cls.templates or template.cell_count > cls.max_cells:
+                return template
+            cls.templates[key] = template
+            ScanTemplate.cached_cells += template.cell_count
+            while ScanTemplate.cached_cells > cls.max_cells:
+                ScanTemplate.cached_cells -=\
+                    cls.templates.popitem(last=False)[1].cell_count
+        return template
+
+    def coordinates(self):
+        """Return the template as a NumPy array sharing its memory.
+
+        Returns:
+            (numpy.ndarray): A read only (cell_count, 2) view of pairs
+        """
+        coordinates = np.frombuffer(self.pairs, np.int64).reshape(
+            self.cell_count, 2)
+        coordinates.flags.writeable = False
+        return coordinates
+
+    def raster_scan_pairs_into(self, start, x_pos, y_pos, x_size, y_size,
+                               scan_type):
+        """Write the bidirectional raster scan of a block into pairs.
+
+        With NumPy the scan is written by raster_scan_cells_into, otherwise
+        each coordinate is written with one slice assignment.
+
+        Args
+            start (int): Position in the template of the block's first cell
+            x_pos (int): x position of the bottom left corner
+            y_pos (int): y position of the bottom left corner
+            x_size (int): The width of the block
+            y_size (int): The height of the block
+            scan_type (int): The scan type of the block
+        """
+        cell_count = x_size * y_size
+        if np is not None:
+            cells = np.frombuffer(self.pairs, np.int64).reshape(
+                self.cell_count, 2)
+            self.raster_scan_cells_into(cells[start:start + cell_count],
+                                        x_pos, y_pos, x_size, y_size,
+                                        scan_type)
+            return
+
+        x_reversed, y_reversed, x_first = Block.scan_instructions[scan_type]
+
+        # Assumes scanning in the y direction first.  For the primary and
+        # secondary directions: position in each cell's pair, first
+        # coordinate, size and whether to start at the high end
+        primary = (1, y_pos, y_size, y_reversed)
+        secondary = (0, x_pos, x_size, x_reversed)
+        if x_first == 1:
+            primary, secondary = secondary, primary
+        primary_pair, primary_pos, primary_size, primary_reversed = primary
+        secondary_pair, secondary_pos, secondary_size, secondary_reversed =\
+            secondary
+
+        line = array('q', range(primary_pos, primary_pos + primary_size))
+        if primary_reversed:
+            line.reverse()
+        # Every second line is scanned backwards
+        lines = (line + line[::-1]) * (secondary_size // 2)
+        if secondary_size % 2 == 1:
+            lines += line
+
+        secondary_line = range(secondary_pos, secondary_pos + secondary_size)
+        if secondary_reversed:
+            secondary_line = secondary_line[::-1]
+
+        self.pairs[2 * start + primary_pair:2 * (start + cell_count):2] =\
+            lines
+        self.pairs[2 * start + secondary_pair:2 * (start + cell_count):2] =\
+            array('q', chain.from_iterable(
+                map(repeat, secondary_line, repeat(primary_size))))
+
+    @staticmethod
+    def raster_scan_cells_into(out, x_pos, y_pos, x_size, y_size,
+                               scan_type):
+        """Write the bidirectional raster scan of a block into an array.
+
+        Used by raster_scan_pairs_into when NumPy is installed.
+
+        Args
+            out (numpy.ndarray): A contiguous (x_size * y_size, 2) integer
+                                 array that receives the (x,y) coordinates
+            x_pos (int): x position of the bottom left corner
+            y_pos (int): y position of the bottom left corner
+            x_size (int): The width of the block
+            y_size (int): The height of the block
+            scan_type (int): The scan type of the block
+        """
+        instructions = Block.scan_instructions[scan_type]
+
+        # First cell and direction of travel along each axis
+        x_start = x_pos + instructions[0] * (x_size - 1)
+        y_start = y_pos + instructions[1] * (y_size - 1)
+        x_step = 1 - 2 * instructions[0]
+        y_step = 1 - 2 * instructions[1]
+
+        # Assumes scanning in the y direction first, axis 1 of the output
+        # (axis, start, step, size) for the primary and secondary directions
+        primary = (1, y_start, y_step, y_size)
+        secondary = (0, x_start, x_step, x_size)
+        if instructions[2] == 1:
+            primary, secondary = secondary, primary
+        primary_axis, primary_start, primary_step, primary_size = primary
+        secondary_axis, secondary_start, secondary_step, secondary_size =\
+            secondary
+
+        # One row of the output per line of the scan.  Every second line is
+        # scanned backwards.
+        cells = out.reshape(secondary_size, primary_size, 2)
+        line = np.arange(primary_start,
+                         primary_start + primary_step * primary_size,
+                         primary_step)
+        cells[0::2, :, primary_axis] = line
+        cells[1::2, :, primary_axis] = line[::-1]
+        cells[:, :, secondary_axis] = np.arange(
+            secondary_start,
+            secondary_start + secondary_step * secondary_size,
+            secondary_step)[:, np.newaxis]
+
+
 class PseudoHilbert:
     """Hold information about and generate pseudo Hilbert curves.
 
@@ -386,17 +1043,36 @@ class PseudoHilbert:
     Args
         width (int): Width of the arbitrary rectangle
         height (int): Height of the arbitrary rectangle
+        backend (str): 'list' (default) for nested Python lists, 'numpy' for
+                       NumPy arrays or 'array' for memoryviews of flat
+                       array.array buffers, which needs only the standard
+                       library
 
     Attributes
         width (int):
         height (int):
+        backend (str): The backend used to store the lookup tables
         coordinate_to_index (list): A 2D list of lists to look up the index from
-                                    coordinates
+                                    coordinates.  With the 'numpy' backend
+                                    this is a (width, height) integer array
+                                    and with 'array' a (width, height)
+                                    memoryview indexed [x, y]
         index_to_coordinate (list): A list of two element (x,y) list coordinates
-                                    to lookup the coordinates from an index
+                                    to lookup the coordinates from an index.
+                                    With the 'numpy' backend this is an (N, 2)
+                                    integer array and with 'array' an (N, 2)
+                                    memoryview
 
     """
 
+    backends = ('list', 'numpy', 'array')
+
+    # Layout of the header of a saved curve, see save.  Padded to 64 bytes so
+    # the tables that follow it are aligned.
+    file_magic = b'PSHC'
+    file_version = 1
+    file_header = struct.Struct('<4sIqqiI32x')
+
     # Lookup table for directions when given two consecutive Hilbert block types
     # Only works for blocks with EVEN EVEN parity
     even_even_block_directions = [None,
@@ -519,12 +1195,17 @@ class PseudoHilbert:
         Args:
             block_list (list): A list of blocks that need their scan type set.
         """
+        # A single block has no travel directions, its scan type is set
+        # below as the first block
+        single_block = len(block_list) == 1
+
         for block in block_list:  # type: Block
 
             # Set the scan type assuming that the shape is even-even
-            block.scan_type =\
-                self.either_odd_scan_lookup[(block.travel_direction_to_enter,
-                                             block.travel_direction_to_leave)]
+            if not single_block:
+                block.scan_type = self.either_odd_scan_lookup[
+                    (block.travel_direction_to_enter,
+                     block.travel_direction_to_leave)]
 
             # Fix the scan types for blocks that aren't even-even
             # These are predetermined values from the paper
@@ -542,102 +1223,713 @@ class PseudoHilbert:
         if block_list[0].shape == (Parity.ODD, Parity.ODD):
             block_list[0].scan_type = 1
 
-    def __init__(self, width, height):
+    @staticmethod
+    def array_dtype(cell_count):
+        """Return the smallest NumPy integer type able to index the cells.
+
+        Args:
+            cell_count (int): The number of cells in the region
+
+        Returns:
+            (numpy.dtype): int32 if every index fits, int64 otherwise
+        """
+        if cell_count <= np.iinfo(np.int32).max:
+            return np.dtype(np.int32)
+        return np.dtype(np.int64)
+
+    @staticmethod
+    def array_typecode(cell_count):
+        """Return the array.array type code used by the 'array' backend.
+
+        Args:
+            cell_count (int): The number of cells in the region
+
+        Returns:
+            (str): 'i' if every index fits, 'q' otherwise
+        """
+        if cell_count <= 0x7fffffff:
+            return 'i'
+        return 'q'
+
+    def __init__(self, width, height, backend='list', build_tables=True,
+                 workers=None, stats=None):
         """Initialise and generate a Pseudo Hilbert Curve.
 
         Args:
             width (int): The width of the arbitrary rectangular region
             height (int): The height of the arbitrary rectangular region
+            backend (str): 'list', 'numpy' or 'array', how to store the
+                           lookup tables
+            build_tables (bool): If False the lookup tables are left as None
+                                 and the curve can only be walked with
+                                 iter_blocks or iter_cells
+            workers (int): Scan blocks in this many processes, 'numpy'
+                           backend only
+            stats (BuildStats): Record the time taken by each phase of the
+                                build in build_stats.  True records times
+                                without tracing memory.
         """
+        if backend not in self.backends:
+            raise ValueError('backend must be one of ' + str(self.backends))
+        if backend == 'numpy' and np is None:
+            raise ImportError("the 'numpy' backend requires NumPy")
+        if workers is not None and workers > 1 and backend != 'numpy':
+            raise ValueError("workers requires the 'numpy' backend")
+
         self.width = width
         self.height = height
+        self.backend = backend
         self.coordinate_to_index = None
         self.index_to_coordinate = None
 
+        # Flattened image positions of each index, by origin, see reorder
+        self.image_indices = {}
+
+        if stats is True:
+            stats = BuildStats()
+        self.build_stats = stats
+
         # Minimum of floor(log2(width/2)) and floor(log2(height/2))
         # Determines the order of the parent Hilbert curve
         self.order = min(math.frexp(self.width)[1],
                          math.frexp(self.height)[1]) - 2
 
-        x_divisions = [self.width]
-        y_divisions = [self.height]
+        if not build_tables:
+            return
 
-        # Calculate how to divide the arbitrary rectangle into blocks
-        for order_count in range(self.order):
-            for division_count in range(len(x_divisions)):
-                length_to_divide = x_divisions.pop(0)
-                divided_length = self.division(length_to_divide)
-                x_divisions.extend(divided_length)
-
-                length_to_divide = y_divisions.pop(0)
-                divided_length = self.division(length_to_divide)
-                y_divisions.extend(divided_length)
-
-        # Calculate the coordinates for the lower left corner of the blocks
-        cumulative_x_divisions = list(accumulate(x_divisions))
-        cumulative_y_divisions = list(accumulate(y_divisions))
-        cumulative_x_divisions.insert(0, 0)
-        cumulative_x_divisions.pop()
-        cumulative_y_divisions.insert(0, 0)
-        cumulative_y_divisions.pop()
-
-        # Generate the Hilbert curve in an iterative manner
-        block_list_size = pow(2, 2*self.order)
-        block_list = [Block] * block_list_size
-        block_list[0] = Block(1, [], [])
-        current_block_count = 1
-        for order_count in range(self.order):
+        stats = self.stats()
+        stats.start()
+        if self.backend == 'numpy':
+            block_table = BlockTable(self.width, self.height, stats)
+            stats.begin_phase('scan', len(block_table),
+                              self.width * self.height)
+            self.fill_arrays(block_table, workers)
+        elif self.backend == 'array':
+            block_list = self.build_lean_block_list()
+            stats.begin_phase('scan', len(block_list),
+                              self.width * self.height)
+            self.fill_memoryviews(block_list)
+        else:
+            block_list = self.build_block_list()
+            stats.begin_phase('scan', len(block_list),
+                              self.width * self.height)
+            self.fill_lists(block_list)
+        stats.finish()
 
-            # Replace blocks with sub-blocks
-            for block_count in range(current_block_count-1, -1, -1):
-                block = block_list[block_count]  # type: Block
-                hilbert_type = block.hilbert_type
+    def stats(self):
+        """Return the BuildStats to record phases in.
 
-                # Create new block by copying them
-                new_blocks = [block.copy() for block in
-                              self.template_table[hilbert_type]]
+        Returns:
+            (BuildStats): build_stats, or a stand in that records nothing
+        """
+        if self.build_stats is None:
+            return no_build_stats
+        return self.build_stats
 
-                # Position new blocks within parent block
-                for new_block in new_blocks:
-                    new_block.position_block(block)
+    @classmethod
+    def get(cls, width, height, backend=None):
+        """Return a shared, read-only curve from the module's curve_cache.
 
-                # Add the blocks to the block list
-                block_list[block_count * 4 + 0] = new_blocks[0]
-                block_list[block_count * 4 + 1] = new_blocks[1]
-                block_list[block_count * 4 + 2] = new_blocks[2]
-                block_list[block_count * 4 + 3] = new_blocks[3]
+        Args:
+            width (int): The width of the arbitrary rectangular region
+            height (int): The height of the arbitrary rectangular region
+            backend (str): 'list', 'numpy' or 'array', defaults to 'numpy'
+                           when NumPy is installed and 'array' otherwise
 
-            current_block_count *= 4
+        Returns:
+            (PseudoHilbert): A curve whose lookup tables can't be modified
+        """
+        return curve_cache.get(width, height, backend)
 
-        # Set block travel directions
-        for block_index in range(0, len(block_list) - 1):
-            direction =\
-                self.hilbert_type_to_direction(block_list[block_index],
-                                               block_list[block_index + 1])
+    def freeze(self):
+        """Make the lookup tables immutable so the curve can be shared.
 
-            first_block = block_list[block_index]
-            second_block = block_list[block_index + 1]
+        NumPy tables are marked read-only, memoryviews are replaced by
+        views of immutable copies and list tables are converted to tuples of
+        tuples.
+        """
+        if self.backend == 'numpy':
+            # Hand out views of read-only arrays so the flag can't simply be
+            # switched back on
+            self.coordinate_to_index.flags.writeable = False
+            self.index_to_coordinate.flags.writeable = False
+            self.coordinate_to_index = self.coordinate_to_index.view()
+            self.index_to_coordinate = self.index_to_coordinate.view()
+        elif self.backend == 'array':
+            # A read-only memoryview still hands out the writable array
+            # behind it as its obj, so the tables are copied into bytes
+            self.coordinate_to_index = self.frozen_view(
+                self.coordinate_to_index)
+            self.index_to_coordinate = self.frozen_view(
+                self.index_to_coordinate)
+        else:
+            self.coordinate_to_index =\
+                tuple(tuple(column) for column in self.coordinate_to_index)
+            self.index_to_coordinate =\
+                tuple(tuple(cell) for cell in self.index_to_coordinate)
 
-            first_block.travel_direction_to_leave = direction
-            second_block.travel_direction_to_enter = direction
+    @staticmethod
+    def frozen_view(table):
+        """Copy an 'array' backend table into an immutable one.
 
-        # Set the coordinates of each block
-        for block in block_list:  # type: Block
-            block.calculate_decimal_indices()
-            block.set_size(x_divisions[block.x_index],
-                           y_divisions[block.y_index])
-            block.set_coordinates(cumulative_x_divisions[block.x_index],
-                                  cumulative_y_divisions[block.y_index])
+        Args:
+            table (memoryview): A table of native integers
 
-        # The shape of the overall arbitrary rectangle is the same as the first
-        # block as all other row and column dimensions are even.
-        first_block = block_list[0]  # type: Block
-        overall_shape = first_block.shape
-        if overall_shape == (Parity.EVEN, Parity.EVEN):
-            self.set_scan_directions_even_even(block_list)
-        else:
-            self.set_scan_directions_either_odd(block_list)
+        Returns:
+            (memoryview): A read-only view of the same shape and format over
+                          a bytes copy of the table
+        """
+        return memoryview(table.tobytes()).cast(table.format, table.shape)
 
+    def table_size(self):
+        """Estimate the memory used by the lookup tables in bytes.
+
+        Returns:
+            (int):
+        """
+        if self.backend in ('numpy', 'array'):
+            return (self.coordinate_to_index.nbytes +
+                    self.index_to_coordinate.nbytes)
+
+        # Containers plus one int object per index.  Coordinates are small
+        # and mostly shared so they aren't counted.
+        size = sys.getsizeof(self.coordinate_to_index)
+        size += sum(sys.getsizeof(column)
+                    for column in self.coordinate_to_index)
+        size += sys.getsizeof(self.index_to_coordinate)
+        size += sum(sys.getsizeof(cell) for cell in self.index_to_coordinate)
+        return size + sys.getsizeof(self.width * self.height) *\
+            self.width * self.height
+
+    @classmethod
+    def from_tables(cls, width, height, coordinate_to_index,
+                    index_to_coordinate, backend='numpy'):
+        """Wrap existing lookup tables in a curve without generating it.
+
+        Args:
+            width (int): The width of the arbitrary rectangular region
+            height (int): The height of the arbitrary rectangular region
+            coordinate_to_index: The coordinate_to_index table
+            index_to_coordinate: The index_to_coordinate table
+            backend (str): The backend the tables belong to
+
+        Returns:
+            curve (PseudoHilbert):
+        """
+        curve = cls(width, height, backend, build_tables=False)
+        curve.coordinate_to_index = coordinate_to_index
+        curve.index_to_coordinate = index_to_coordinate
+        return curve
+
+    def save(self, path):
+        """Write the lookup tables to a file that load can memory map.
+
+        The file is a 64 byte header holding a magic number, the format
+        version, width, height, order and the integer size in bytes,
+        followed by coordinate_to_index as width * height little endian
+        integers in [x][y] order and then index_to_coordinate as
+        width * height (x, y) pairs.
+
+        Args:
+            path (str): The file to write
+        """
+        cell_count = self.width * self.height
+        if self.backend == 'numpy':
+            dtype = self.coordinate_to_index.dtype.newbyteorder('<')
+            tables = [self.coordinate_to_index.astype(dtype, copy=False),
+                      self.index_to_coordinate.astype(dtype, copy=False)]
+            itemsize = dtype.itemsize
+        else:
+            typecode = self.array_typecode(cell_count)
+            if self.backend == 'array':
+                tables = [array(typecode), array(typecode)]
+                tables[0].frombytes(self.coordinate_to_index.cast('B'))
+                tables[1].frombytes(self.index_to_coordinate.cast('B'))
+            else:
+                tables = [array(typecode, (index for column in
+                                           self.coordinate_to_index
+                                           for index in column)),
+                          array(typecode, (value for cell in
+                                           self.index_to_coordinate
+                                           for value in cell))]
+            if sys.byteorder == 'big':
+                for table in tables:
+                    table.byteswap()
+            itemsize = tables[0].itemsize
+
+        with open(path, 'wb') as file:
+            file.write(self.file_header.pack(
+                self.file_magic, self.file_version, self.width, self.height,
+                self.order, itemsize))
+            for table in tables:
+                file.write(memoryview(table).cast('B'))
+
+    @classmethod
+    def load(cls, path, use_mmap=True):
+        """Load lookup tables written by save as NumPy arrays.
+
+        With use_mmap the arrays are read-only views straight onto a shared
+        memory map of the file, so processes loading the same file share one
+        copy in the page cache.
+
+        Args:
+            path (str): The file to read
+            use_mmap (bool): Memory map the file instead of reading it
+
+        Returns:
+            (PseudoHilbert): A curve using the 'numpy' backend
+        """
+        if np is None:
+            raise ImportError('loading a curve requires NumPy')
+
+        with open(path, 'rb') as file:
+            magic, version, width, height, order, itemsize =\
+                cls.file_header.unpack(file.read(cls.file_header.size))
+            if magic != cls.file_magic:
+                raise ValueError(str(path) + ' is not a saved curve')
+            if version != cls.file_version:
+                raise ValueError('unsupported curve file version ' +
+                                 str(version))
+
+            dtype = np.dtype('<i' + str(itemsize))
+            cell_count = width * height
+            if use_mmap:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                offset = cls.file_header.size
+            else:
+                buffer = file.read()
+                offset = 0
+        if len(buffer) - offset != 3 * cell_count * itemsize:
+            raise ValueError(str(path) + ' is truncated or has extra data')
+
+        coordinate_to_index = np.frombuffer(
+            buffer, dtype, cell_count, offset).reshape(width, height)
+        index_to_coordinate = np.frombuffer(
+            buffer, dtype, 2 * cell_count,
+            offset + cell_count * itemsize).reshape(cell_count, 2)
+
+        curve = cls.from_tables(width, height, coordinate_to_index,
+                                index_to_coordinate)
+        if curve.order != order:
+            raise ValueError(str(path) + ' has an inconsistent order')
+        return curve
+
+    def image_index_order(self, origin='lower'):
+        """Return the position of each cell in a flattened row-major image.
+
+        Images are indexed [row, column, ...] with the column being x.  With
+        origin 'lower' row 0 holds y = 0, matching the curve's coordinate
+        system.  With origin 'upper' row 0 holds y = height - 1, the usual
+        layout of an image on screen.
+
+        Args:
+            origin (str): 'lower' or 'upper'
+
+        Returns:
+            (numpy.ndarray): For each index, row * width + column
+        """
+        if np is None:
+            raise ImportError('reordering arrays requires NumPy')
+        if origin not in ('lower', 'upper'):
+            raise ValueError("origin must be 'lower' or 'upper'")
+        if origin not in self.image_indices:
+            coordinates = np.asarray(self.index_to_coordinate)
+            rows = coordinates[:, 1]
+            if origin == 'upper':
+                rows = self.height - 1 - rows
+            image_indices = rows * self.width + coordinates[:, 0]
+            image_indices.flags.writeable = False
+            self.image_indices[origin] = image_indices
+        return self.image_indices[origin]
+
+    def reorder(self, image, out=None, origin='lower'):
+        """Gather an image into curve order.
+
+        Args:
+            image (numpy.ndarray): A (height, width, ...) array, any trailing
+                                   dimensions such as colour channels are
+                                   carried along
+            out (numpy.ndarray): Optional (width * height, ...) array to
+                                 write the result into
+            origin (str): 'lower' or 'upper', see image_index_order
+
+        Returns:
+            (numpy.ndarray): A (width * height, ...) array where element n
+                             is the pixel at index n of the curve
+        """
+        image = np.asarray(image)
+        if image.shape[:2] != (self.height, self.width):
+            raise ValueError('expected an image of shape ' +
+                             str((self.height, self.width)) + ' not ' +
+                             str(image.shape[:2]))
+        pixels = image.reshape((self.width * self.height,) + image.shape[2:])
+        return np.take(pixels, self.image_index_order(origin), axis=0,
+                       out=out)
+
+    def restore(self, sequence, out=None, origin='lower'):
+        """Scatter data in curve order back into an image.
+
+        The inverse of reorder.
+
+        Args:
+            sequence (numpy.ndarray): A (width * height, ...) array in curve
+                                      order
+            out (numpy.ndarray): Optional contiguous (height, width, ...)
+                                 array to write the result into
+            origin (str): 'lower' or 'upper', see image_index_order
+
+        Returns:
+            (numpy.ndarray): A (height, width, ...) image
+        """
+        sequence = np.asarray(sequence)
+        if len(sequence) != self.width * self.height:
+            raise ValueError('expected ' + str(self.width * self.height) +
+                             ' elements not ' + str(len(sequence)))
+        if out is None:
+            out = np.empty((self.height, self.width) + sequence.shape[1:],
+                           sequence.dtype)
+        elif not out.flags.c_contiguous:
+            raise ValueError('out must be C contiguous')
+        pixels = out.reshape((self.width * self.height,) + out.shape[2:])
+        pixels[self.image_index_order(origin)] = sequence
+        return out
+
+    @classmethod
+    def build_many(cls, shapes, workers=None, backend=None):
+        """Build curves for many region sizes, yielding each when ready.
+
+        Repeated shapes are built once.  Shapes are grouped by order and each
+        order is split into at most one batch per worker, so every batch is
+        built by one process that orders the blocks of its order once, see
+        hilbert_order.  Workers send each curve back through a queue as soon
+        as it's built, so curves are yielded as each one completes, not in
+        the order given.
+
+        Args:
+            shapes (iterable): (width, height) pairs
+            workers (int): Number of processes, None or 1 builds in this
+                           process
+            backend (str): 'list', 'numpy' or 'array', defaults to 'numpy'
+                           when NumPy is installed and 'array' otherwise
+
+        Yields:
+            (tuple): ((width, height), curve) pairs
+        """
+        if backend is None:
+            backend = 'array' if np is None else 'numpy'
+
+        by_order = {}
+        for width, height in dict.fromkeys(tuple(shape) for shape in shapes):
+            order = min(math.frexp(width)[1], math.frexp(height)[1]) - 2
+            by_order.setdefault(order, []).append((width, height))
+
+        if workers is None or workers <= 1:
+            for order_shapes in by_order.values():
+                for width, height in order_shapes:
+                    yield (width, height), cls(width, height, backend)
+            return
+
+        # Split each order into at most one batch per worker
+        batches = []
+        for order_shapes in by_order.values():
+            batch_size = -(-len(order_shapes) // workers)
+            batches.extend(order_shapes[start:start + batch_size]
+                           for start in range(0, len(order_shapes),
+                                              batch_size))
+
+        with multiprocessing.Manager() as manager:
+            results = manager.Queue()
+            with ProcessPoolExecutor(workers, initializer=set_result_queue,
+                                     initargs=(results,)) as executor:
+                futures = [executor.submit(build_curves, batch, backend)
+                           for batch in batches]
+                try:
+                    for count in range(sum(map(len, batches))):
+                        yield next_result(results, futures)
+                finally:
+                    for future in futures:
+                        future.cancel()
+
+    @classmethod
+    def iter_coordinates(cls, width, height):
+        """Yield the cells of a curve in order without building its tables.
+
+        Args:
+            width (int): The width of the arbitrary rectangular region
+            height (int): The height of the arbitrary rectangular region
+
+        Yields:
+            (list): Two element [x, y] coordinates in curve order
+        """
+        return cls(width, height, build_tables=False).iter_cells()
+
+    def iter_cells(self):
+        """Yield every cell of the curve in order.
+
+        Only the block list is held in memory, not the full lookup tables.
+
+        Yields:
+            (list): Two element [x, y] coordinates in curve order
+        """
+        for block_cells in self.iter_blocks():
+            if self.backend == 'array':
+                # Multi-dimensional memoryviews can't be iterated
+                block_cells = block_cells.tolist()
+            yield from block_cells
+
+    def iter_blocks(self):
+        """Yield the cells of each block in curve order.
+
+        Only the block list is held in memory, not the full lookup tables.
+        With the 'numpy' backend the blocks are held in a BlockTable and each
+        chunk is an (n, 2) array, with 'array' each chunk is an (n, 2)
+        memoryview, otherwise it is a list of [x, y] lists.
+
+        Yields:
+            (list): The scanned cells of one block
+        """
+        if self.backend == 'numpy':
+            block_table = BlockTable(self.width, self.height)
+            dtype = self.array_dtype(self.width * self.height)
+            # One block at a time its template is moved directly, without
+            # the grouping BlockTable.scan_into does for many blocks
+            for x_pos, y_pos, x_size, y_size, scan_type in zip(
+                    *(column.tolist() for column in
+                      block_table.rows(0, len(block_table)))):
+                cells = np.empty((x_size * y_size, 2), dtype)
+                Block.scan_cells_into(cells, x_pos, y_pos, x_size, y_size,
+                                      scan_type)
+                yield cells
+        elif self.backend == 'array':
+            typecode = self.array_typecode(self.width * self.height)
+            for block in self.build_lean_block_list():  # type: LeanBlock
+                cell_count = block.x_size * block.y_size
+                cells = array(typecode, [0]) * (2 * cell_count)
+                block.scan_into(cells, 0)
+                yield memoryview(cells).cast('B').cast(typecode,
+                                                       (cell_count, 2))
+        else:
+            for block in self.build_block_list():  # type: Block
+                yield block.scan()
+
+    def build_block_list(self):
+        """Divide the region into blocks and order them along the curve.
+
+        Returns:
+            block_list (list): Blocks in curve order with their size, position
+                               and scan type set
+        """
+        stats = self.stats()
+        # Regions less than four cells across are a single block
+        block_list_size = pow(4, max(self.order, 0))
+        cell_count = self.width * self.height
+
+        # Calculate how to divide the arbitrary rectangle into blocks
+        stats.begin_phase('division', block_list_size, cell_count)
+        # and the coordinates for the lower left corner of the blocks
+        x_plan = AxisPlan.get(self.width, self.order)
+        y_plan = AxisPlan.get(self.height, self.order)
+        x_divisions = x_plan.divisions
+        y_divisions = y_plan.divisions
+        cumulative_x_divisions = x_plan.offsets
+        cumulative_y_divisions = y_plan.offsets
+
+        # The Hilbert curve of blocks is shared by every curve of the same
+        # order.  The blocks' binary addresses are left empty, their decimal
+        # indices come straight from the shared ordering.
+        stats.begin_phase('subdivision', block_list_size, cell_count)
+        block_list = []
+        for hilbert_type, x_index, y_index in\
+                zip(*self.hilbert_order(max(self.order, 0))):
+            block = Block(hilbert_type, [], [])
+            block.x_index = x_index
+            block.y_index = y_index
+            block_list.append(block)
+
+        # Set block travel directions
+        stats.begin_phase('travel_directions', block_list_size, cell_count)
+        for block_index in range(0, len(block_list) - 1):
+            direction =\
+                self.hilbert_type_to_direction(block_list[block_index],
+                                               block_list[block_index + 1])
+
+            first_block = block_list[block_index]
+            second_block = block_list[block_index + 1]
+
+            first_block.travel_direction_to_leave = direction
+            second_block.travel_direction_to_enter = direction
+
+        # Set the coordinates of each block
+        stats.begin_phase('coordinates', block_list_size, cell_count)
+        for block in block_list:  # type: Block
+            block.set_size(x_divisions[block.x_index],
+                           y_divisions[block.y_index])
+            block.set_coordinates(cumulative_x_divisions[block.x_index],
+                                  cumulative_y_divisions[block.y_index])
+
+        # The shape of the overall arbitrary rectangle is the same as the first
+        # block as all other row and column dimensions are even.
+        stats.begin_phase('scan_types', block_list_size, cell_count)
+        first_block = block_list[0]  # type: Block
+        overall_shape = first_block.shape
+        if overall_shape == (Parity.EVEN, Parity.EVEN):
+            self.set_scan_directions_even_even(block_list)
+        else:
+            self.set_scan_directions_either_odd(block_list)
+        stats.end_phase()
+
+        return block_list
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def hilbert_order(order):
+        """Return the hilbert type and location of every block of an order.
+
+        Every block is replaced with its four sub-blocks once per order,
+        following the hilbert_children state machine of CurveDescriptor.
+        The result depends only on the order, so it's shared between curves,
+        as BlockTable.hilbert_order is for the 'numpy' backend.
+
+        Args:
+            order (int): The order of the parent Hilbert curve
+
+        Returns:
+            (tuple): hilbert_type, x_index and y_index arrays in curve order
+        """
+        hilbert_types = [1]
+        x_indices = [0]
+        y_indices = [0]
+        for order_count in range(order):
+            next_types = []
+            next_x_indices = []
+            next_y_indices = []
+            for hilbert_type, x_index, y_index in zip(hilbert_types,
+                                                      x_indices, y_indices):
+                for child_type, x_bit, y_bit in\
+                        CurveDescriptor.hilbert_children[hilbert_type]:
+                    next_types.append(child_type)
+                    next_x_indices.append(2 * x_index + x_bit)
+                    next_y_indices.append(2 * y_index + y_bit)
+            hilbert_types = next_types
+            x_indices = next_x_indices
+            y_indices = next_y_indices
+        return (array('b', hilbert_types), array('q', x_indices),
+                array('q', y_indices))
+
+    def build_lean_block_list(self):
+        """Build the block list for the 'array' backend.
+
+        Follows the same steps as build_block_list using LeanBlock objects
+        and integer coded directions.
+
+        Returns:
+            block_list (list): LeanBlocks in curve order with their scan type
+                               set
+        """
+        stats = self.stats()
+        block_list_size = pow(4, max(self.order, 0))
+        cell_count = self.width * self.height
+
+        stats.begin_phase('division', block_list_size, cell_count)
+        x_plan = AxisPlan.get(self.width, self.order)
+        y_plan = AxisPlan.get(self.height, self.order)
+
+        stats.begin_phase('subdivision', block_list_size, cell_count)
+        hilbert_types, x_indices, y_indices =\
+            self.hilbert_order(max(self.order, 0))
+
+        stats.begin_phase('travel_directions', block_list_size, cell_count)
+        direction_codes = LeanBlock.direction_codes
+        leave = [direction_codes[first_type][second_type]
+                 for first_type, second_type in zip(hilbert_types,
+                                                    hilbert_types[1:])]
+        leave.append(0)
+        enter = [0] + leave[:-1]
+
+        stats.begin_phase('coordinates', block_list_size, cell_count)
+        x_divisions = x_plan.divisions
+        y_divisions = y_plan.divisions
+        x_offsets = x_plan.offsets
+        y_offsets = y_plan.offsets
+        block_list = [LeanBlock(hilbert_type, x_offsets[x_index],
+                                y_offsets[y_index], x_divisions[x_index],
+                                y_divisions[y_index])
+                      for hilbert_type, x_index, y_index in
+                      zip(hilbert_types, x_indices, y_indices)]
+
+        # The same rules as set_scan_directions_even_even and
+        # set_scan_directions_either_odd
+        stats.begin_phase('scan_types', block_list_size, cell_count)
+        first_block = block_list[0]  # type: LeanBlock
+        if first_block.x_size % 2 == 0 and first_block.y_size % 2 == 0:
+            for block in block_list:  # type: LeanBlock
+                block.scan_type = block.hilbert_type
+        else:
+            scan_codes = LeanBlock.either_odd_scan_codes
+            for block, enter_code, leave_code in zip(block_list, enter,
+                                                     leave):
+                x_odd = block.x_size % 2
+                y_odd = block.y_size % 2
+                if x_odd and not y_odd:
+                    block.scan_type = 8
+                elif y_odd and not x_odd:
+                    block.scan_type = 7
+                else:
+                    block.scan_type = scan_codes[enter_code][leave_code]
+            if first_block.x_size % 2 == 1:
+                first_block.scan_type = 1
+            elif first_block.y_size % 2 == 1:
+                first_block.scan_type = 2
+            for block, enter_code, leave_code in zip(block_list, enter,
+                                                     leave):
+                if block.scan_type is None:
+                    raise KeyError((Direction(enter_code) if enter_code
+                                    else None,
+                                    Direction(leave_code) if leave_code
+                                    else None))
+        stats.end_phase()
+
+        return block_list
+
+    def fill_memoryviews(self, block_list):
+        """Scan every block and fill the lookup tables as flat arrays.
+
+        Both tables are single array.array buffers, [x][y] ordered for
+        coordinate_to_index and x, y pairs for index_to_coordinate, exposed
+        as two dimensional memoryviews.
+
+        Args:
+            block_list (list): LeanBlocks in curve order with scan types set
+        """
+        cell_count = self.width * self.height
+        typecode = self.array_typecode(cell_count)
+        coordinate_to_index = array(typecode, [0]) * cell_count
+        index_to_coordinate = array(typecode, [0]) * (2 * cell_count)
+
+        index = 0
+        for block in block_list:  # type: LeanBlock
+            index = block.scan_into(index_to_coordinate, index)
+
+        # Invert the finished curve in one pass, entry x * height + y of
+        # coordinate_to_index holding the index of (x, y)
+        positions = map(operator.add,
+                        map(operator.mul, index_to_coordinate[0::2],
+                            repeat(self.height)),
+                        index_to_coordinate[1::2])
+        for index, position in enumerate(positions):
+            coordinate_to_index[position] = index
+
+        self.coordinate_to_index = memoryview(coordinate_to_index).cast(
+            'B').cast(typecode, (self.width, self.height))
+        self.index_to_coordinate = memoryview(index_to_coordinate).cast(
+            'B').cast(typecode, (cell_count, 2))
+
+    def fill_lists(self, block_list):
+        """Scan every block and fill the lookup tables as Python lists.
+
+        Args:
+            block_list (list): Blocks in curve order with scan types set
+        """
         # Create the output lists.  i and j are unused.
         self.coordinate_to_index =\
             [[None for i in range(self.height)] for j in range(self.width)]
@@ -667,4 +1959,2740 @@ class PseudoHilbert:
                       block.travel_direction_to_enter,
                       block.travel_direction_to_leave,
                       block.shape,
-                      block.scan_type)
\ No newline at end of file
+                      block.scan_type)
+
+    def fill_arrays(self, block_table, workers=None):
+        """Scan every block and fill the lookup tables as NumPy arrays.
+
+        Each block is scanned straight into its slice of index_to_coordinate,
+        which is then inverted into coordinate_to_index in one operation.
+
+        Args:
+            block_table (BlockTable): The blocks of the curve
+            workers (int): Number of processes to scan with, see
+                           fill_arrays_in_parallel
+        """
+        cell_count = self.width * self.height
+        dtype = self.array_dtype(cell_count)
+        if workers is not None and workers > 1 and len(block_table) > 1:
+            self.fill_arrays_in_parallel(block_table, workers, dtype)
+            return
+
+        self.coordinate_to_index = np.empty((self.width, self.height), dtype)
+        self.index_to_coordinate = np.empty((cell_count, 2), dtype)
+
+        block_table.scan_into(self.index_to_coordinate)
+
+        # Invert the finished curve in a single scatter
+        self.coordinate_to_index[self.index_to_coordinate[:, 0],
+                                 self.index_to_coordinate[:, 1]] =\
+            np.arange(cell_count, dtype=dtype)
+
+    def fill_arrays_in_parallel(self, block_table, workers, dtype):
+        """Scan ranges of blocks in a process pool.
+
+        Every block's place in the output is known from
+        BlockTable.first_index, so the block table is split into one
+        contiguous range per worker holding about the same number of cells.
+        The workers write both tables straight into shared memory, which
+        then backs the curve's tables without being copied.
+
+        Args:
+            block_table (BlockTable): The blocks of the curve
+            workers (int): Number of processes to use
+            dtype (numpy.dtype): The integer type of the tables
+        """
+        cell_count = self.width * self.height
+        boundaries = np.searchsorted(
+            block_table.first_index,
+            np.linspace(0, cell_count, workers + 1)[1:-1]).tolist()
+        boundaries = sorted(set([0] + boundaries + [len(block_table)]))
+
+        # The tables are allocated once in memory the workers inherit, and
+        # the finished tables are views of it, so nothing is copied back
+        # and the memory is freed with the last view of either table.
+        tables = multiprocessing.RawArray('b', 3 * cell_count * dtype.itemsize)
+        with ProcessPoolExecutor(workers, initializer=set_shared_tables,
+                                 initargs=(tables,)) as executor:
+            futures = [executor.submit(scan_block_range,
+                                       self.width, self.height, dtype.str,
+                                       int(block_table.first_index[start]),
+                                       block_table.rows(start, stop))
+                       for start, stop in zip(boundaries, boundaries[1:])]
+            for future in futures:
+                future.result()
+
+        self.coordinate_to_index, self.index_to_coordinate =\
+            shared_tables(tables, self.width, self.height, dtype)
+
+
+class CurveDescriptor:
+    """Answer point lookups on a pseudo Hilbert curve without lookup tables.
+
+    Each order only splits two or three distinct lengths along each side,
+    and only those splits are stored, see AxisPlan.level_splits.  Memory
+    grows with the order rather than with the number of blocks or cells, a
+    few kilobytes even for a 100000 x 100000 region.  The size and position
+    of a block follow from the bits of its row and column by walking down the
+    splits one order at a time.  The block holding a cell and its place in
+    the curve are found by walking down the splits and the Hilbert curve
+    together.
+
+    Args
+        width (int): Width of the arbitrary rectangle
+        height (int): Height of the arbitrary rectangle
+
+    Attributes
+        width (int):
+        height (int):
+        order (int): The order of the parent Hilbert curve
+        x_splits (tuple): How the width is split at each order, see
+                          AxisPlan.level_splits
+        y_splits (tuple): How the height is split at each order
+    """
+
+    # For each hilbert type, the (hilbert_type, x_bit, y_bit) of its four
+    # sub-blocks in curve order, taken from PseudoHilbert.template_table
+    hilbert_children = [None] + [
+        [(block.hilbert_type, block.address_x[0], block.address_y[0])
+         for block in PseudoHilbert.template_table[hilbert_type]]
+        for hilbert_type in range(1, 5)]
+
+    # For each hilbert type, map (x_bit, y_bit) to the sub-block's position
+    # in curve order
+    hilbert_digits = [None] + [
+        {(block.address_x[0], block.address_y[0]): digit for digit, block in
+         enumerate(PseudoHilbert.template_table[hilbert_type])}
+        for hilbert_type in range(1, 5)]
+
+    def __init__(self, width, height):
+        """Divide the region into blocks without ordering or scanning them.
+
+        Args:
+            width (int): The width of the arbitrary rectangular region
+            height (int): The height of the arbitrary rectangular region
+        """
+        self.width = width
+        self.height = height
+        self.order = min(math.frexp(width)[1], math.frexp(height)[1]) - 2
+
+        self.x_splits = AxisPlan.level_splits(width, self.order)
+        self.y_splits = AxisPlan.level_splits(height, self.order)
+
+        self.overall_shape = (
+            Parity.EVEN if width % 2 == 0 else Parity.ODD,
+            Parity.EVEN if height % 2 == 0 else Parity.ODD)
+        # Regions less than four cells across are a single block
+        self.block_count = pow(4, max(self.order, 0))
+
+    @staticmethod
+    def segment(splits, length, index):
+        """Find the position and length of a block along one side.
+
+        Args:
+            splits (tuple): x_splits or y_splits
+            length (int): The length of the side
+            index (int): Column or row of the block
+
+        Returns:
+            (tuple): (position, length) of the block
+        """
+        position = 0
+        depth = len(splits)
+        for level, split in enumerate(splits):
+            first, second = split[length]
+            if (index >> (depth - 1 - level)) & 1:
+                position += first
+                length = second
+            else:
+                length = first
+        return position, length
+
+    def block_hilbert_type(self, block_number):
+        """Return the hilbert type of the nth block along the curve.
+
+        Args:
+            block_number (int): Position of the block along the curve
+
+        Returns:
+            hilbert_type (int):
+        """
+        hilbert_type = 1
+        for shift in range(2 * self.order - 2, -1, -2):
+            digit = (block_number >> shift) & 3
+            hilbert_type = self.hilbert_children[hilbert_type][digit][0]
+        return hilbert_type
+
+    def block_location(self, block_number):
+        """Return the hilbert type and position of the nth block.
+
+        Args:
+            block_number (int): Position of the block along the curve
+
+        Returns:
+            (tuple): (hilbert_type, x_index, y_index)
+        """
+        hilbert_type = 1
+        x_index = 0
+        y_index = 0
+        for shift in range(2 * self.order - 2, -1, -2):
+            digit = (block_number >> shift) & 3
+            hilbert_type, x_bit, y_bit =\
+                self.hilbert_children[hilbert_type][digit]
+            x_index = 2 * x_index + x_bit
+            y_index = 2 * y_index + y_bit
+        return hilbert_type, x_index, y_index
+
+    def locate_cell(self, x, y):
+        """Find the block containing a cell.
+
+        Args:
+            x (int): x coordinate of the cell
+            y (int): y coordinate of the cell
+
+        Returns:
+            (tuple): (block_number, hilbert_type, x_index, y_index,
+                      first_index) where first_index is the index of the
+                      block's first cell
+        """
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise IndexError('cell ' + str((x, y)) + ' is outside the region')
+
+        hilbert_type = 1
+        block_number = 0
+        first_index = 0
+        x_index = y_index = 0
+        # Position and size of the current group of blocks
+        x_low = y_low = 0
+        x_size = self.width
+        y_size = self.height
+        for x_split, y_split in zip(self.x_splits, self.y_splits):
+            x_parts = x_split[x_size]
+            y_parts = y_split[y_size]
+            x_bit = int(x >= x_low + x_parts[0])
+            y_bit = int(y >= y_low + y_parts[0])
+            digit = self.hilbert_digits[hilbert_type][(x_bit, y_bit)]
+
+            # Skip over the sub-blocks that come before this one
+            for sub_type, sub_x_bit, sub_y_bit in\
+                    self.hilbert_children[hilbert_type][:digit]:
+                first_index += x_parts[sub_x_bit] * y_parts[sub_y_bit]
+
+            x_low += x_bit * x_parts[0]
+            y_low += y_bit * y_parts[0]
+            x_size = x_parts[x_bit]
+            y_size = y_parts[y_bit]
+            x_index = 2 * x_index + x_bit
+            y_index = 2 * y_index + y_bit
+            block_number = block_number * 4 + digit
+            hilbert_type = self.hilbert_children[hilbert_type][digit][0]
+
+        return block_number, hilbert_type, x_index, y_index, first_index
+
+    def locate_index(self, index):
+        """Find the block containing the cell at an index.
+
+        Args:
+            index (int): Position along the curve
+
+        Returns:
+            (tuple): (block_number, hilbert_type, x_index, y_index,
+                      first_index) where first_index is the index of the
+                      block's first cell
+        """
+        if not 0 <= index < self.width * self.height:
+            raise IndexError('index ' + str(index) + ' is outside the curve')
+
+        hilbert_type = 1
+        block_number = 0
+        first_index = 0
+        x_index = y_index = 0
+        # Size of the current group of blocks
+        x_size = self.width
+        y_size = self.height
+        for x_split, y_split in zip(self.x_splits, self.y_splits):
+            x_parts = x_split[x_size]
+            y_parts = y_split[y_size]
+            for digit, (sub_type, sub_x_bit, sub_y_bit) in\
+                    enumerate(self.hilbert_children[hilbert_type]):
+                cell_count = x_parts[sub_x_bit] * y_parts[sub_y_bit]
+                if index < first_index + cell_count:
+                    break
+                first_index += cell_count
+
+            x_size = x_parts[sub_x_bit]
+            y_size = y_parts[sub_y_bit]
+            x_index = 2 * x_index + sub_x_bit
+            y_index = 2 * y_index + sub_y_bit
+            block_number = block_number * 4 + digit
+            hilbert_type = sub_type
+
+        return block_number, hilbert_type, x_index, y_index, first_index
+
+    def block(self, block_number, hilbert_type, x_index, y_index):
+        """Build the Block at a position along the curve, ready to scan.
+
+        Args:
+            block_number (int): Position of the block along the curve
+            hilbert_type (int): The hilbert type of the block
+            x_index (int): Column of the block
+            y_index (int): Row of the block
+
+        Returns:
+            block (Block): A Block with size, position, directions and scan
+                           type set as PseudoHilbert would set them
+        """
+        block = Block(hilbert_type, [], [])
+        block.x_index = x_index
+        block.y_index = y_index
+        x_pos, x_size = self.segment(self.x_splits, self.width, x_index)
+        y_pos, y_size = self.segment(self.y_splits, self.height, y_index)
+        block.set_size(x_size, y_size)
+        block.set_coordinates(x_pos, y_pos)
+
+        directions = PseudoHilbert.even_even_block_directions
+        if block_number > 0:
+            block.travel_direction_to_enter = directions[
+                self.block_hilbert_type(block_number - 1)][hilbert_type]
+        if block_number < self.block_count - 1:
+            block.travel_direction_to_leave = directions[hilbert_type][
+                self.block_hilbert_type(block_number + 1)]
+
+        # Mirror set_scan_directions_even_even and
+        # set_scan_directions_either_odd for a single block
+        if self.overall_shape == (Parity.EVEN, Parity.EVEN):
+            block.scan_type = hilbert_type
+            return block
+
+        # A single block has no travel directions, its scan type is set
+        # below as the first block
+        if self.block_count > 1:
+            block.scan_type = PseudoHilbert.either_odd_scan_lookup[
+                (block.travel_direction_to_enter,
+                 block.travel_direction_to_leave)]
+        if block.shape == (Parity.ODD, Parity.EVEN):
+            block.scan_type = 8
+        if block.shape == (Parity.EVEN, Parity.ODD):
+            block.scan_type = 7
+        if block_number == 0:
+            if block.shape == (Parity.ODD, Parity.EVEN):
+                block.scan_type = 1
+            if block.shape == (Parity.EVEN, Parity.ODD):
+                block.scan_type = 2
+            if block.shape == (Parity.ODD, Parity.ODD):
+                block.scan_type = 1
+        return block
+
+    def iter_blocks(self):
+        """Yield the blocks of the curve in order without a block list.
+
+        Each block is built from its block number as it's needed, so only
+        one block is held at a time however large the region is.
+
+        Yields:
+            (Block): Blocks in curve order, ready to scan
+        """
+        for block_number in range(self.block_count):
+            yield self.block(block_number,
+                             *self.block_location(block_number))
+
+    def ranges(self, x_start, y_start, x_stop, y_stop):
+        """Cover a rectangular window with as few index ranges as possible.
+
+        The Hilbert curve of blocks is walked from the top down.  Groups of
+        blocks that lie completely inside the window become one range each
+        and groups outside it are skipped, so only blocks crossed by the edge
+        of the window are looked at cell by cell.  The work grows with the
+        perimeter of the window rather than its area.
+
+        Args:
+            x_start (int): Left edge of the window
+            y_start (int): Bottom edge of the window
+            x_stop (int): One past the right edge of the window
+            y_stop (int): One past the top edge of the window
+
+        Returns:
+            ranges (list): Sorted, non-adjacent [start, stop) index ranges
+                           that together hold exactly the cells with
+                           x_start <= x < x_stop and y_start <= y < y_stop
+        """
+        x_start = max(x_start, 0)
+        y_start = max(y_start, 0)
+        x_stop = min(x_stop, self.width)
+        y_stop = min(y_stop, self.height)
+        ranges = []
+        if x_start < x_stop and y_start < y_stop:
+            self.collect_ranges(ranges, (x_start, y_start, x_stop, y_stop),
+                                1, 0, 0, 0, 0,
+                                (0, 0, self.width, self.height), 0)
+        return ranges
+
+    def collect_ranges(self, ranges, window, hilbert_type, block_number,
+                       x_index, y_index, level, group, first_index):
+        """Add the index ranges of a group of blocks inside a window.
+
+        Args:
+            ranges (list): Ranges found so far, extended in place
+            window (tuple): (x_start, y_start, x_stop, y_stop) of the window
+            hilbert_type (int): The hilbert type of the group
+            block_number (int): Position along the curve of the group, in
+                                units of groups of this size
+            x_index (int): Column of the group among groups of this size
+            y_index (int): Row of the group among groups of this size
+            level (int): Number of orders walked down to reach the group
+            group (tuple): (x_low, y_low, x_size, y_size) of the group
+            first_index (int): Index of the first cell of the group
+        """
+        x_start, y_start, x_stop, y_stop = window
+        x_low, y_low, x_size, y_size = group
+        x_high = x_low + x_size
+        y_high = y_low + y_size
+
+        if x_high <= x_start or x_stop <= x_low or\
+                y_high <= y_start or y_stop <= y_low:
+            return
+
+        if x_start <= x_low and x_high <= x_stop and\
+                y_start <= y_low and y_high <= y_stop:
+            new_ranges = [[first_index,
+                           first_index + (x_high - x_low) * (y_high - y_low)]]
+        elif level == len(self.x_splits):
+            block = self.block(block_number, hilbert_type, x_index, y_index)
+            new_ranges = [[first_index + start, first_index + stop]
+                          for start, stop in block.window_ranges(*window)]
+        else:
+            x_parts = self.x_splits[level][x_size]
+            y_parts = self.y_splits[level][y_size]
+            for digit, (sub_type, sub_x_bit, sub_y_bit) in\
+                    enumerate(self.hilbert_children[hilbert_type]):
+                sub_group = (x_low + sub_x_bit * x_parts[0],
+                             y_low + sub_y_bit * y_parts[0],
+                             x_parts[sub_x_bit], y_parts[sub_y_bit])
+                self.collect_ranges(ranges, window, sub_type,
+                                    block_number * 4 + digit,
+                                    2 * x_index + sub_x_bit,
+                                    2 * y_index + sub_y_bit, level + 1,
+                                    sub_group, first_index)
+                first_index += sub_group[2] * sub_group[3]
+            return
+
+        # Join ranges that continue straight on from the previous one
+        for start, stop in new_ranges:
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = stop
+            else:
+                ranges.append([start, stop])
+
+    def index_of(self, x, y):
+        """Return the index of a cell, like coordinate_to_index[x][y].
+
+        Args:
+            x (int): x coordinate of the cell
+            y (int): y coordinate of the cell
+
+        Returns:
+            (int): Position of the cell along the curve
+        """
+        block_number, hilbert_type, x_index, y_index, first_index =\
+            self.locate_cell(x, y)
+        block = self.block(block_number, hilbert_type, x_index, y_index)
+        return first_index + block.cell_to_offset(x, y)
+
+    def coordinate_of(self, index):
+        """Return the cell at an index, like index_to_coordinate[index].
+
+        Args:
+            index (int): Position along the curve
+
+        Returns:
+            (list): A two element [x, y] coordinate
+        """
+        block_number, hilbert_type, x_index, y_index, first_index =\
+            self.locate_index(index)
+        block = self.block(block_number, hilbert_type, x_index, y_index)
+        return block.offset_to_cell(index - first_index)
+
+    def cursor(self, index=0):
+        """Return a CurveCursor that walks the curve from an index.
+
+        Args:
+            index (int): Position along the curve to start at
+
+        Returns:
+            (CurveCursor):
+        """
+        return CurveCursor(self, index)
+
+    def partition(self, k):
+        """Split the curve into k contiguous shards of equal length.
+
+        Shard lengths differ by at most one cell.  Each shard comes with a
+        cursor already at its first cell, so a worker only touches the
+        blocks its shard covers.
+
+        Args:
+            k (int): Number of shards
+
+        Returns:
+            (list): (start, stop, cursor) for each shard, covering indices
+                    start to stop - 1
+        """
+        if k < 1:
+            raise ValueError('k must be at least 1')
+        cell_count = self.width * self.height
+        boundaries = [shard * cell_count // k for shard in range(k + 1)]
+        return [(start, stop, CurveCursor(self, start))
+                for start, stop in zip(boundaries, boundaries[1:])]
+
+    # Array versions of the Block and Hilbert lookup tables used by the
+    # *_many methods, built on first use
+    hilbert_digit_codes = None
+    scan_instruction_codes = None
+    optimisation_path_codes = None
+    optimisation_path_digits = None
+
+    @classmethod
+    def build_lookup_tables(cls):
+        """Convert the lookup tables used by Block into arrays."""
+        if BlockTable.child_type is None:
+            BlockTable.build_lookup_tables()
+
+        # hilbert_digits indexed by [hilbert_type, x_bit, y_bit]
+        cls.hilbert_digit_codes = np.zeros((5, 2, 2), np.int8)
+        for hilbert_type in range(1, 5):
+            for (x_bit, y_bit), digit in\
+                    cls.hilbert_digits[hilbert_type].items():
+                cls.hilbert_digit_codes[hilbert_type, x_bit, y_bit] = digit
+
+        # scan_instructions, row 0 is unused
+        cls.scan_instruction_codes = np.zeros((9, 3), np.int8)
+        cls.scan_instruction_codes[1:] = Block.scan_instructions[1:]
+
+        # even_even_optimisation_path indexed by [scan_type, sub_block] and
+        # the position of each sub-block by [scan_type, x_bit, y_bit]
+        cls.optimisation_path_codes = np.zeros((9, 4, 3), np.int64)
+        cls.optimisation_path_codes[1:] = Block.even_even_optimisation_path[1:]
+        cls.optimisation_path_digits = np.zeros((9, 2, 2), np.int8)
+        for scan_type in range(1, 9):
+            for block_index, (sub_scan_type, x_bit, y_bit) in enumerate(
+                    Block.even_even_optimisation_path[scan_type]):
+                cls.optimisation_path_digits[scan_type, x_bit, y_bit] =\
+                    block_index
+
+    @staticmethod
+    def split_many(sizes):
+        """Array version of PseudoHilbert.division.
+
+        Args:
+            sizes (numpy.ndarray): int64 sizes of groups of blocks
+
+        Returns:
+            (tuple): Arrays of the first and second part of each size
+        """
+        two_to_the_mth = np.left_shift(1, np.frexp(sizes)[1] - 2)
+        second = np.where(sizes > 3 * two_to_the_mth, 2 * two_to_the_mth,
+                          two_to_the_mth)
+        return sizes - second, second
+
+    def segment_many(self, length, index):
+        """Array version of segment.
+
+        Args:
+            length (int): The length of the side
+            index (numpy.ndarray): Column or row of each block
+
+        Returns:
+            (tuple): int64 position and length arrays
+        """
+        position = np.zeros(index.shape, np.int64)
+        size = np.full(index.shape, length, np.int64)
+        depth = max(self.order, 0)
+        for shift in range(depth - 1, -1, -1):
+            first, second = self.split_many(size)
+            upper = (index >> shift) & 1 == 1
+            position += np.where(upper, first, 0)
+            size = np.where(upper, second, first)
+        return position, size
+
+    def block_hilbert_type_many(self, block_numbers):
+        """Array version of block_hilbert_type.
+
+        Args:
+            block_numbers (numpy.ndarray): Positions of blocks along the curve
+
+        Returns:
+            hilbert_type (numpy.ndarray):
+        """
+        hilbert_type = np.ones(block_numbers.shape, np.int8)
+        for shift in range(2 * self.order - 2, -1, -2):
+            hilbert_type = BlockTable.child_type[
+                hilbert_type, (block_numbers >> shift) & 3]
+        return hilbert_type
+
+    def block_many(self, block_numbers, hilbert_type, x_index, y_index):
+        """Array version of block, describing many blocks at once.
+
+        Args:
+            block_numbers (numpy.ndarray): Positions of the blocks along the
+                                           curve
+            hilbert_type (numpy.ndarray): The hilbert type of each block
+            x_index (numpy.ndarray): Column of each block
+            y_index (numpy.ndarray): Row of each block
+
+        Returns:
+            (tuple): x_pos, y_pos, x_size, y_size and scan_type arrays
+        """
+        x_pos, x_size = self.segment_many(self.width, np.asarray(x_index))
+        y_pos, y_size = self.segment_many(self.height, np.asarray(y_index))
+        return (x_pos, y_pos, x_size, y_size,
+                self.scan_type_many(block_numbers, hilbert_type,
+                                    x_size, y_size))
+
+    def scan_type_many(self, block_numbers, hilbert_type, x_size, y_size):
+        """Set the scan types of many blocks, see block_many.
+
+        Args:
+            block_numbers (numpy.ndarray): Positions of the blocks along the
+                                           curve
+            hilbert_type (numpy.ndarray): The hilbert type of each block
+            x_size (numpy.ndarray): Width of each block
+            y_size (numpy.ndarray): Height of each block
+
+        Returns:
+            scan_type (numpy.ndarray):
+        """
+        if self.overall_shape == (Parity.EVEN, Parity.EVEN):
+            return hilbert_type
+
+        # Mirror BlockTable.set_scan_directions_either_odd
+        first = block_numbers == 0
+        last = block_numbers == self.block_count - 1
+        previous_type = self.block_hilbert_type_many(
+            np.where(first, 0, block_numbers - 1))
+        next_type = self.block_hilbert_type_many(
+            np.where(last, 0, block_numbers + 1))
+        enter = np.where(first, 0, BlockTable.direction_codes[
+            previous_type, hilbert_type])
+        leave = np.where(last, 0, BlockTable.direction_codes[
+            hilbert_type, next_type])
+        scan_type = BlockTable.either_odd_scan_codes[enter, leave]
+
+        x_odd = x_size % 2 == 1
+        y_odd = y_size % 2 == 1
+        scan_type[x_odd & ~y_odd] = 8
+        scan_type[~x_odd & y_odd] = 7
+        scan_type[first & x_odd] = 1
+        scan_type[first & ~x_odd & y_odd] = 2
+
+        missing = np.flatnonzero(scan_type < 0)
+        if len(missing) > 0:
+            raise KeyError((
+                Direction(enter[missing[0]]) if enter[missing[0]] else None,
+                Direction(leave[missing[0]]) if leave[missing[0]] else None))
+        return scan_type
+
+    @classmethod
+    def split_blocks(cls, x_pos, y_pos, x_size, y_size, scan_type,
+                     block_index):
+        """Replace blocks scanned in four parts by the sub-block in use.
+
+        Array version of Block.sub_blocks for blocks with both sides
+        divisible by 4, the others are left unchanged.
+
+        Args:
+            x_pos (numpy.ndarray): x position of each block
+            y_pos (numpy.ndarray): y position of each block
+            x_size (numpy.ndarray): Width of each block
+            y_size (numpy.ndarray): Height of each block
+            scan_type (numpy.ndarray): Scan type of each block
+            block_index (numpy.ndarray): Which of the four sub-blocks to use
+
+        Returns:
+            (tuple): x_pos, y_pos, x_size, y_size, scan_type arrays and
+                     the split flag of each block
+        """
+        split = (x_size % 4 == 0) & (y_size % 4 == 0)
+        path = cls.optimisation_path_codes[scan_type, block_index]
+        half_x_size = x_size // 2
+        half_y_size = y_size // 2
+        x_pos = np.where(split, x_pos + path[:, 1] * half_x_size, x_pos)
+        y_pos = np.where(split, y_pos + path[:, 2] * half_y_size, y_pos)
+        x_size = np.where(split, half_x_size, x_size)
+        y_size = np.where(split, half_y_size, y_size)
+        scan_type = np.where(split, path[:, 0], scan_type)
+        return x_pos, y_pos, x_size, y_size, scan_type, split
+
+    def index_of_many(self, x, y):
+        """Array version of index_of.
+
+        Args:
+            x (numpy.ndarray): x coordinates of the cells
+            y (numpy.ndarray): y coordinates of the cells
+
+        Returns:
+            (numpy.ndarray): int64 position of each cell along the curve
+        """
+        if self.scan_instruction_codes is None:
+            self.build_lookup_tables()
+        x = np.asarray(x, np.int64)
+        y = np.asarray(y, np.int64)
+        if x.shape != y.shape:
+            raise ValueError('x and y must have the same shape')
+        if x.size and (x.min() < 0 or x.max() >= self.width or
+                       y.min() < 0 or y.max() >= self.height):
+            raise IndexError('cells must lie inside the region')
+        shape = x.shape
+        x = x.ravel()
+        y = y.ravel()
+
+        # Walk down the curve as in locate_cell
+        hilbert_type = np.ones(x.shape, np.int8)
+        block_numbers = np.zeros(x.shape, np.int64)
+        first_index = np.zeros(x.shape, np.int64)
+        x_low = np.zeros(x.shape, np.int64)
+        y_low = np.zeros(x.shape, np.int64)
+        x_size = np.full(x.shape, self.width, np.int64)
+        y_size = np.full(x.shape, self.height, np.int64)
+        for order_count in range(self.order):
+            x_first, x_second = self.split_many(x_size)
+            y_first, y_second = self.split_many(y_size)
+            x_bit = (x >= x_low + x_first).astype(np.int64)
+            y_bit = (y >= y_low + y_first).astype(np.int64)
+            digit = self.hilbert_digit_codes[hilbert_type, x_bit, y_bit]
+            for sibling in range(3):
+                cell_count = (
+                    np.where(BlockTable.child_x_bit[hilbert_type, sibling],
+                             x_second, x_first) *
+                    np.where(BlockTable.child_y_bit[hilbert_type, sibling],
+                             y_second, y_first))
+                first_index += np.where(sibling < digit, cell_count, 0)
+            x_low += x_bit * x_first
+            y_low += y_bit * y_first
+            x_size = np.where(x_bit, x_second, x_first)
+            y_size = np.where(y_bit, y_second, y_first)
+            block_numbers = block_numbers * 4 + digit
+            hilbert_type = BlockTable.child_type[hilbert_type, digit]
+
+        x_pos = x_low
+        y_pos = y_low
+        scan_type = self.scan_type_many(block_numbers, hilbert_type,
+                                        x_size, y_size)
+
+        # Find the sub-block of blocks scanned in four parts
+        block_index = self.optimisation_path_digits[
+            scan_type,
+            (2 * (x - x_pos) >= x_size).astype(np.int8),
+            (2 * (y - y_pos) >= y_size).astype(np.int8)]
+        x_pos, y_pos, x_size, y_size, scan_type, split = self.split_blocks(
+            x_pos, y_pos, x_size, y_size, scan_type, block_index)
+        first_index += np.where(split, block_index * x_size * y_size, 0)
+
+        # Vectorised Block.raster_cell_to_offset
+        instructions = self.scan_instruction_codes[scan_type]
+        x_step = x - x_pos
+        y_step = y - y_pos
+        x_step = np.where(instructions[:, 0] == 1, x_size - 1 - x_step, x_step)
+        y_step = np.where(instructions[:, 1] == 1, y_size - 1 - y_step, y_step)
+        x_first = instructions[:, 2] == 1
+        primary_step = np.where(x_first, x_step, y_step)
+        secondary_step = np.where(x_first, y_step, x_step)
+        primary_size = np.where(x_first, x_size, y_size)
+        primary_step = np.where(secondary_step % 2 == 1,
+                                primary_size - 1 - primary_step, primary_step)
+        return (first_index + secondary_step * primary_size +
+                primary_step).reshape(shape)
+
+    def coordinate_of_many(self, indices):
+        """Array version of coordinate_of.
+
+        Args:
+            indices (numpy.ndarray): Positions along the curve
+
+        Returns:
+            (tuple): int64 x and y coordinate arrays
+        """
+        if self.scan_instruction_codes is None:
+            self.build_lookup_tables()
+        indices = np.asarray(indices, np.int64)
+        if indices.size and (indices.min() < 0 or
+                             indices.max() >= self.width * self.height):
+            raise IndexError('indices must lie inside the curve')
+        shape = indices.shape
+        offset = indices.ravel().copy()
+
+        # Walk down the curve as in locate_index, offset becomes the
+        # position within the current group of blocks
+        hilbert_type = np.ones(offset.shape, np.int8)
+        block_numbers = np.zeros(offset.shape, np.int64)
+        x_pos = np.zeros(offset.shape, np.int64)
+        y_pos = np.zeros(offset.shape, np.int64)
+        x_size = np.full(offset.shape, self.width, np.int64)
+        y_size = np.full(offset.shape, self.height, np.int64)
+        for order_count in range(self.order):
+            x_first, x_second = self.split_many(x_size)
+            y_first, y_second = self.split_many(y_size)
+            digit = np.zeros(offset.shape, np.int8)
+            x_bit = np.zeros(offset.shape, np.int64)
+            y_bit = np.zeros(offset.shape, np.int64)
+            passed = np.zeros(offset.shape, np.int64)
+            for sibling in range(4):
+                sibling_x_bit = BlockTable.child_x_bit[hilbert_type, sibling]
+                sibling_y_bit = BlockTable.child_y_bit[hilbert_type, sibling]
+                cell_count = (np.where(sibling_x_bit, x_second, x_first) *
+                              np.where(sibling_y_bit, y_second, y_first))
+                beyond = (digit == sibling) & (offset >= passed + cell_count)
+                if sibling < 3:
+                    digit[beyond] += 1
+                    passed[beyond] += cell_count[beyond]
+                found = (digit == sibling) & ~beyond
+                x_bit[found] = sibling_x_bit[found]
+                y_bit[found] = sibling_y_bit[found]
+            offset -= passed
+            x_pos += x_bit * x_first
+            y_pos += y_bit * y_first
+            x_size = np.where(x_bit, x_second, x_first)
+            y_size = np.where(y_bit, y_second, y_first)
+            block_numbers = block_numbers * 4 + digit
+            hilbert_type = BlockTable.child_type[hilbert_type, digit]
+
+        scan_type = self.scan_type_many(block_numbers, hilbert_type,
+                                        x_size, y_size)
+
+        # Find the sub-block of blocks scanned in four parts
+        split = (x_size % 4 == 0) & (y_size % 4 == 0)
+        sub_block_cells = np.maximum(x_size * y_size // 4, 1)
+        block_index = np.where(split, offset // sub_block_cells, 0)
+        offset = np.where(split, offset % sub_block_cells, offset)
+        x_pos, y_pos, x_size, y_size, scan_type, split = self.split_blocks(
+            x_pos, y_pos, x_size, y_size, scan_type, block_index)
+
+        # Vectorised Block.raster_offset_to_cell
+        instructions = self.scan_instruction_codes[scan_type]
+        x_first = instructions[:, 2] == 1
+        primary_size = np.where(x_first, x_size, y_size)
+        secondary_step, primary_step = np.divmod(offset, primary_size)
+        primary_step = np.where(secondary_step % 2 == 1,
+                                primary_size - 1 - primary_step, primary_step)
+        x_step = np.where(x_first, primary_step, secondary_step)
+        y_step = np.where(x_first, secondary_step, primary_step)
+        x_step = np.where(instructions[:, 0] == 1, x_size - 1 - x_step, x_step)
+        y_step = np.where(instructions[:, 1] == 1, y_size - 1 - y_step, y_step)
+        return ((x_pos + x_step).reshape(shape),
+                (y_pos + y_step).reshape(shape))
+
+    def sort_points(self, x, y):
+        """Return the permutation that sorts points into curve order.
+
+        Args:
+            x (numpy.ndarray): x coordinates of the points
+            y (numpy.ndarray): y coordinates of the points
+
+        Returns:
+            (numpy.ndarray): Indices that sort the points, points with equal
+                             coordinates keep their original order
+        """
+        return np.argsort(self.index_of_many(x, y), kind='stable')
+
+
+class CurveCursor:
+    """Walk a pseudo Hilbert curve forwards from any index.
+
+    Seeking finds the block holding an index with CurveDescriptor's running
+    totals in O(order) steps and the cell within the block from its scan
+    instructions, without building the curve.  Stepping forwards scans one
+    block at a time, moving to the next block when the current one runs
+    out.
+
+    The cursor is an iterator of [x, y] cells, starting with the cell at
+    index.
+
+    Args
+        descriptor (CurveDescriptor): The curve to walk
+        index (int): Position along the curve to start at
+
+    Attributes
+        descriptor (CurveDescriptor):
+        index (int): Index of the next cell to be returned
+        block (Block): The block holding index, None past the end
+        block_number (int): Position of block along the curve
+        first_index (int): Index of the first cell of block
+    """
+
+    def __init__(self, descriptor, index=0):
+        """Create a cursor positioned at an index.
+
+        Args:
+            descriptor (CurveDescriptor): The curve to walk
+            index (int): Position along the curve to start at
+        """
+        self.descriptor = descriptor
+        self.cell_count = descriptor.width * descriptor.height
+        self.index = None
+        self.block = None
+        self.block_number = None
+        self.first_index = None
+
+        # The block's scan, only made once the cursor steps through it
+        self.cells = None
+
+        self.seek(index)
+
+    def seek(self, index):
+        """Move the cursor to an index.
+
+        Args:
+            index (int): Position along the curve, the cell count moves the
+                         cursor to the end
+        """
+        if not 0 <= index <= self.cell_count:
+            raise IndexError('index ' + str(index) + ' is outside the curve')
+        self.index = index
+        self.block = None
+        self.cells = None
+        if index == self.cell_count:
+            return
+
+        block_number, hilbert_type, x_index, y_index, first_index =\
+            self.descriptor.locate_index(index)
+        self.enter_block(block_number, first_index,
+                         hilbert_type, x_index, y_index)
+
+    def enter_block(self, block_number, first_index, hilbert_type=None,
+                    x_index=None, y_index=None):
+        """Make a block the current block.
+
+        Args:
+            block_number (int): Position of the block along the curve
+            first_index (int): Index of the block's first cell
+            hilbert_type (int): The block's hilbert type, found from the
+                                block number if not given
+            x_index (int): Column of the block
+            y_index (int): Row of the block
+        """
+        if hilbert_type is None:
+            hilbert_type, x_index, y_index =\
+                self.descriptor.block_location(block_number)
+        self.block_number = block_number
+        self.first_index = first_index
+        self.block = self.descriptor.block(block_number, hilbert_type,
+                                           x_index, y_index)
+        self.cells = None
+
+    def cell(self):
+        """Return the cell at the cursor without moving it.
+
+        Returns:
+            (list): A two element [x, y] coordinate
+        """
+        if self.block is None:
+            raise IndexError('the cursor is at the end of the curve')
+        if self.cells is not None:
+            return self.cells[self.index - self.first_index]
+        return self.block.offset_to_cell(self.index - self.first_index)
+
+    def __iter__(self):
+        """Return the cursor, which is its own iterator."""
+        return self
+
+    def __next__(self):
+        """Return the cell at the cursor and step forwards.
+
+        Returns:
+            (list): A two element [x, y] coordinate
+        """
+        if self.block is None:
+            raise StopIteration
+        if self.cells is None:
+            self.cells = self.block.scan()
+        cell = self.cells[self.index - self.first_index]
+        self.step(1)
+        return cell
+
+    def step(self, count):
+        """Move forwards without leaving the block the cursor is in.
+
+        Args:
+            count (int): Number of cells to move, at most the number left in
+                         the block
+        """
+        self.index += count
+        if self.index == self.cell_count:
+            self.block = None
+            self.cells = None
+        elif self.index == (self.first_index + self.block.x_size *
+                            self.block.y_size):
+            self.enter_block(self.block_number + 1, self.index)
+
+    def take(self, count):
+        """Step forwards over several cells.
+
+        Args:
+            count (int): The most cells to return
+
+        Returns:
+            (list): Up to count [x, y] cells, fewer at the end of the curve
+        """
+        cells = []
+        while len(cells) < count and self.block is not None:
+            if self.cells is None:
+                self.cells = self.block.scan()
+            offset = self.index - self.first_index
+            block_cells = self.cells[offset:offset + count - len(cells)]
+            cells.extend(block_cells)
+            self.step(len(block_cells))
+        return cells
+
+
+class LeanBlock:
+    """A Block cut down to what's needed to scan it, for the 'array' backend.
+
+    Uses __slots__ and plain integers instead of Direction and Parity enums,
+    and scans straight into flat array.array buffers rather than creating a
+    list per cell.  Directions are coded as the integer value of a Direction
+    with 0 standing for None.
+
+    Args:
+        hilbert_type (int): Can be 1, 2, 3, 4
+        x_pos (int): x position of the bottom left corner
+        y_pos (int): y position of the bottom left corner
+        x_size (int): The width of the block
+        y_size (int): The height of the block
+
+    Attributes:
+        hilbert_type (int):
+        x_pos (int):
+        y_pos (int):
+        x_size (int):
+        y_size (int):
+        scan_type (int): See Block.scan_instructions
+    """
+
+    __slots__ = ('hilbert_type', 'x_pos', 'y_pos', 'x_size', 'y_size',
+                 'scan_type')
+
+    # even_even_block_directions as integers, indexed by
+    # [hilbert_type][next_hilbert_type]
+    direction_codes = [[0] * 5] + [
+        [0] + [direction.value for direction in directions[1:]]
+        for directions in PseudoHilbert.even_even_block_directions[1:]]
+
+    # either_odd_scan_lookup as integers, indexed by [enter][leave].  None
+    # marks combinations missing from the lookup
+    either_odd_scan_codes = [[None] * 5 for enter in range(5)]
+    for (enter, leave), scan_type in\
+            PseudoHilbert.either_odd_scan_lookup.items():
+        either_odd_scan_codes[0 if enter is None else enter.value][
+            0 if leave is None else leave.value] = scan_type
+    del enter, leave, scan_type
+
+    def __init__(self, hilbert_type, x_pos, y_pos, x_size, y_size):
+        """Initialise a block whose scan type is set later.
+
+        Args:
+            hilbert_type (int): Can be 1, 2, 3, 4
+            x_pos (int): x position of the bottom left corner
+            y_pos (int): y position of the bottom left corner
+            x_size (int): The width of the block
+            y_size (int): The height of the block
+        """
+        self.hilbert_type = hilbert_type
+        self.x_pos = x_pos
+        self.y_pos = y_pos
+        self.x_size = x_size
+        self.y_size = y_size
+        self.scan_type = None
+
+    def scan_into(self, cells, index):
+        """Scan the block into a flat array.
+
+        Produces the same cells as Block.scan, including the split into four
+        sub-blocks when both sides are divisible by 4, by moving the block's
+        ScanTemplate to its position.  The template's offsets are added in
+        one pass with map rather than a Python loop over cells.
+
+        Args
+            cells (array): Flat x, y pairs, the block's cells are written
+                           from pair number index onwards
+            index (int): Index of the block's first cell
+
+        Returns:
+            (int): The index after the block's last cell
+        """
+        template = ScanTemplate.get(self.x_size, self.y_size, self.scan_type)
+        stop = index + template.cell_count
+        cells[2 * index:2 * stop] = array(cells.typecode, map(
+            operator.add, template.pairs, cycle((self.x_pos, self.y_pos))))
+        return stop
+
+
+class ChainCode:
+    """A compact encoding of a pseudo Hilbert curve as moves between cells.
+
+    Every cell of the curve is next to the one before it, so the curve is
+    fully described by its first cell and the direction of each step.  Two
+    forms are kept
+
+    segments      Runs of steps in one direction as parallel directions and
+                  lengths arrays, made straight from the block scans without
+                  visiting cells.  The lines of each serpentine are single
+                  runs.
+    chain_code    Two bits per step, four steps per byte, see pack_steps.
+
+    Every checkpoint_interval segments the index and cell at the start of the
+    segment are recorded, so any cell can be found by walking at most that
+    many segments.
+
+    Directions are coded 0 for +x, 1 for +y, 2 for -x and 3 for -y.
+
+    Args
+        width (int): Width of the arbitrary rectangle
+        height (int): Height of the arbitrary rectangle
+        checkpoint_interval (int): Segments between checkpoints
+
+    Attributes
+        width (int):
+        height (int):
+        cell_count (int):
+        directions (array): Direction of each segment
+        lengths (array): Number of steps in each segment
+        checkpoint_interval (int):
+        checkpoint_index (array): Index of the first cell of every
+                                  checkpoint_interval-th segment
+        checkpoint_x (array): x coordinate of that cell
+        checkpoint_y (array): y coordinate of that cell
+    """
+
+    # Change in x and y for each direction code
+    x_steps = (1, 0, -1, 0)
+    y_steps = (0, 1, 0, -1)
+
+    # For each byte of a chain code, the direction of its nth step
+    step_tables = [bytes((value >> (2 * step)) & 3 for value in range(256))
+                   for step in range(4)]
+
+    def __init__(self, width, height, checkpoint_interval=256):
+        """Encode the curve for a region.
+
+        Args:
+            width (int): The width of the arbitrary rectangular region
+            height (int): The height of the arbitrary rectangular region
+            checkpoint_interval (int): Segments between checkpoints
+        """
+        self.width = width
+        self.height = height
+        self.cell_count = width * height
+        self.checkpoint_interval = checkpoint_interval
+        self.directions = array('B')
+        # Segments are straight, so no longer than the region
+        self.lengths = array('I')
+
+        curve = PseudoHilbert(width, height, 'array', build_tables=False)
+        self.encode(curve.build_lean_block_list())
+
+        # Walk the segments once to place the checkpoints.  The first cell
+        # is always a checkpoint, even for a 1 x 1 region with no segments.
+        self.checkpoint_index = array('q', [0])
+        self.checkpoint_x = array('q', [0])
+        self.checkpoint_y = array('q', [0])
+        index = x = y = 0
+        for segment, (direction, length) in enumerate(zip(self.directions,
+                                                          self.lengths)):
+            if segment > 0 and segment % checkpoint_interval == 0:
+                self.checkpoint_index.append(index)
+                self.checkpoint_x.append(x)
+                self.checkpoint_y.append(y)
+            index += length
+            x += self.x_steps[direction] * length
+            y += self.y_steps[direction] * length
+
+    def encode(self, block_list):
+        """Turn the scans of blocks into segments.
+
+        Args:
+            block_list (list): LeanBlocks in curve order with scan types set
+        """
+        for direction, length in self.iter_segments(block_list):
+            self.directions.append(direction)
+            self.lengths.append(length)
+
+    @classmethod
+    def iter_segments(cls, blocks):
+        """Yield the segments of the scans of blocks one at a time.
+
+        Each line of a bidirectional raster scan is one segment, joined to
+        the next line, and to the next block, by a single step.  Consecutive
+        steps in the same direction are merged, so a segment is only yielded
+        once the curve turns.
+
+        Args:
+            blocks (iterable): Blocks or LeanBlocks in curve order with scan
+                               types set, such as CurveDescriptor.iter_blocks
+
+        Yields:
+            (tuple): (direction, length) of each segment
+        """
+        x_steps = cls.x_steps
+        y_steps = cls.y_steps
+        # The segment being built, held back until the direction changes
+        current_direction = None
+        current_length = 0
+        # The current cell, the end of the last step
+        x = y = 0
+
+        for block in blocks:
+            if block.x_size % 4 == 0 and block.y_size % 4 == 0:
+                half_x_size = block.x_size // 2
+                half_y_size = block.y_size // 2
+                rasters = [(block.x_pos + x_offset * half_x_size,
+                            block.y_pos + y_offset * half_y_size,
+                            half_x_size, half_y_size, scan_type)
+                           for scan_type, x_offset, y_offset in
+                           Block.even_even_optimisation_path[
+                               block.scan_type]]
+            else:
+                rasters = [(block.x_pos, block.y_pos, block.x_size,
+                            block.y_size, block.scan_type)]
+
+            for x_pos, y_pos, x_size, y_size, scan_type in rasters:
+                x_reversed, y_reversed, x_first =\
+                    Block.scan_instructions[scan_type]
+                first_x = x_pos + x_reversed * (x_size - 1)
+                first_y = y_pos + y_reversed * (y_size - 1)
+
+                x_direction = 2 if x_reversed else 0
+                y_direction = 3 if y_reversed else 1
+                if x_first:
+                    primary, primary_size = x_direction, x_size
+                    secondary, secondary_size = y_direction, y_size
+                else:
+                    primary, primary_size = y_direction, y_size
+                    secondary, secondary_size = x_direction, x_size
+
+                # A step from the current cell to the first of the raster,
+                # then every second line scanned backwards
+                steps = []
+                if first_x != x:
+                    steps.append((0 if first_x > x else 2, 1))
+                elif first_y != y:
+                    steps.append((1 if first_y > y else 3, 1))
+                for line in range(secondary_size):
+                    steps.append((primary ^ (2 * (line % 2)),
+                                  primary_size - 1))
+                    if line < secondary_size - 1:
+                        steps.append((secondary, 1))
+
+                for direction, length in steps:
+                    if length == 0:
+                        continue
+                    if direction == current_direction:
+                        current_length += length
+                        continue
+                    if current_length:
+                        yield current_direction, current_length
+                    current_direction = direction
+                    current_length = length
+
+                # Finish on the last cell of the raster
+                x = first_x
+                y = first_y
+                if x_first:
+                    y += y_steps[secondary] * (secondary_size - 1)
+                    if secondary_size % 2 == 0:
+                        continue
+                    x += x_steps[primary] * (primary_size - 1)
+                else:
+                    x += x_steps[secondary] * (secondary_size - 1)
+                    if secondary_size % 2 == 0:
+                        continue
+                    y += y_steps[primary] * (primary_size - 1)
+
+        if current_length:
+            yield current_direction, current_length
+
+    def nbytes(self):
+        """Return the memory used by the segments and checkpoints in bytes.
+
+        Returns:
+            (int):
+        """
+        return sum(table.itemsize * len(table) for table in
+                   (self.directions, self.lengths, self.checkpoint_index,
+                    self.checkpoint_x, self.checkpoint_y))
+
+    def seek(self, index):
+        """Find the segment holding a cell.
+
+        Args:
+            index (int): Position along the curve
+
+        Returns:
+            (tuple): (segment, first index of the segment, x, y) where x and
+                     y are the coordinates of the segment's first cell
+        """
+        if not 0 <= index < self.cell_count:
+            raise IndexError('index ' + str(index) + ' is outside the curve')
+        checkpoint = bisect_right(self.checkpoint_index, index) - 1
+        segment = checkpoint * self.checkpoint_interval
+        first_index = self.checkpoint_index[checkpoint]
+        x = self.checkpoint_x[checkpoint]
+        y = self.checkpoint_y[checkpoint]
+        while segment < len(self.lengths):
+            length = self.lengths[segment]
+            if index < first_index + length:
+                break
+            direction = self.directions[segment]
+            first_index += length
+            x += self.x_steps[direction] * length
+            y += self.y_steps[direction] * length
+            segment += 1
+        return segment, first_index, x, y
+
+    def cell_at(self, index):
+        """Return the cell at an index, like index_to_coordinate[index].
+
+        Args:
+            index (int): Position along the curve
+
+        Returns:
+            (list): A two element [x, y] coordinate
+        """
+        segment, first_index, x, y = self.seek(index)
+        if index > first_index:
+            direction = self.directions[segment]
+            x += self.x_steps[direction] * (index - first_index)
+            y += self.y_steps[direction] * (index - first_index)
+        return [x, y]
+
+    def iter_cells(self, start=0, stop=None):
+        """Yield the cells from one index up to another.
+
+        Args:
+            start (int): Index of the first cell
+            stop (int): One past the last index, defaults to the end
+
+        Yields:
+            (list): Two element [x, y] coordinates in curve order
+        """
+        if stop is None or stop > self.cell_count:
+            stop = self.cell_count
+        if start >= stop:
+            return
+        segment, index, x, y = self.seek(start)
+        # Walk forwards a step at a time, skipping cells before start
+        steps_left = stop - index - 1
+        if index == start:
+            yield [x, y]
+        for direction, length in zip(self.directions[segment:],
+                                     self.lengths[segment:]):
+            x_step = self.x_steps[direction]
+            y_step = self.y_steps[direction]
+            for count in range(min(length, steps_left)):
+                x += x_step
+                y += y_step
+                index += 1
+                if index >= start:
+                    yield [x, y]
+            steps_left -= length
+            if steps_left <= 0:
+                return
+
+    def decode(self, start=0, stop=None):
+        """Decode a range of the curve into coordinates with NumPy.
+
+        Args:
+            start (int): Index of the first cell
+            stop (int): One past the last index, defaults to the end
+
+        Returns:
+            (numpy.ndarray): (stop - start, 2) array of (x, y)
+        """
+        if np is None:
+            raise ImportError('decoding requires NumPy')
+        if stop is None or stop > self.cell_count:
+            stop = self.cell_count
+        if start >= stop:
+            return np.empty((0, 2), np.int64)
+        segment, first_index, x, y = self.seek(start)
+        # The last cell of the curve is past the end of the last segment
+        last_segment = min(self.seek(stop - 1)[0] + 1, len(self.lengths))
+
+        directions = np.asarray(
+            memoryview(self.directions)[segment:last_segment])
+        lengths = np.asarray(memoryview(self.lengths)[segment:last_segment])
+        steps = np.repeat(directions, lengths)[start - first_index:
+                                               stop - 1 - first_index]
+        cells = np.empty((stop - start, 2), np.int64)
+        cells[0] = self.cell_at(start)
+        cells[1:, 0] = np.array(self.x_steps)[steps]
+        cells[1:, 1] = np.array(self.y_steps)[steps]
+        return np.cumsum(cells, axis=0, out=cells)
+
+    def chain_code(self):
+        """Return the direction of every step packed two bits at a time.
+
+        Returns:
+            (bytes): cell_count - 1 steps, see pack_steps
+        """
+        steps = bytearray(self.cell_count - 1)
+        index = 0
+        for direction, length in zip(self.directions, self.lengths):
+            steps[index:index + length] = bytes((direction,)) * length
+            index += length
+        return self.pack_steps(steps)
+
+    @staticmethod
+    def pack_steps(steps):
+        """Pack one direction per byte into four per byte.
+
+        Step n is held in bits 2 * (n % 4) and 2 * (n % 4) + 1 of byte
+        n // 4, any unused bits at the end are zero.
+
+        Args:
+            steps (bytes): Direction codes, one per byte
+
+        Returns:
+            (bytes):
+        """
+        # Each byte of the four slices holds a value below four, so the
+        # slices can be shifted and added as big integers without carrying
+        # between bytes
+        byte_count = -(-len(steps) // 4)
+        steps = bytes(steps) + bytes(4 * byte_count - len(steps))
+        packed = 0
+        for step in range(4):
+            packed |= int.from_bytes(steps[step::4], 'little') << (2 * step)
+        return packed.to_bytes(byte_count, 'little')
+
+    @classmethod
+    def unpack_steps(cls, chain_code, step_count):
+        """Unpack a chain code into one direction per byte.
+
+        Args:
+            chain_code (bytes): Packed steps, see pack_steps
+            step_count (int): The number of steps
+
+        Returns:
+            (bytearray):
+        """
+        steps = bytearray(4 * len(chain_code))
+        for step in range(4):
+            steps[step::4] = chain_code.translate(cls.step_tables[step])
+        del steps[step_count:]
+        return steps
+
+    @classmethod
+    def decode_chain_code(cls, chain_code, step_count, x=0, y=0):
+        """Decode a chain code into coordinates with NumPy.
+
+        Args:
+            chain_code (bytes): Packed steps, see pack_steps
+            step_count (int): The number of steps
+            x (int): x coordinate of the first cell
+            y (int): y coordinate of the first cell
+
+        Returns:
+            (numpy.ndarray): (step_count + 1, 2) array of (x, y)
+        """
+        if np is None:
+            raise ImportError('decoding requires NumPy')
+        steps = np.frombuffer(bytes(cls.unpack_steps(chain_code, step_count)),
+                              np.uint8)
+        cells = np.empty((step_count + 1, 2), np.int64)
+        cells[0] = (x, y)
+        cells[1:, 0] = np.array(cls.x_steps)[steps]
+        cells[1:, 1] = np.array(cls.y_steps)[steps]
+        return np.cumsum(cells, axis=0, out=cells)
+
+
+class BlockTable:
+    """The blocks of a pseudo Hilbert curve stored as parallel NumPy arrays.
+
+    Does the same job as PseudoHilbert.build_block_list without creating a
+    Block object per block.  Row n of every array describes the nth block
+    along the curve.  The hilbert type and location of every block are found
+    at once by running the Hilbert type state machine in
+    CurveDescriptor.hilbert_children over the bits of the block numbers.
+
+    Directions are stored as the integer value of a Direction with 0 standing
+    for None, and shapes as two arrays of 0 for even and 1 for odd.
+
+    Args
+        width (int): Width of the arbitrary rectangle
+        height (int): Height of the arbitrary rectangle
+        stats (BuildStats): Optionally record the time taken by each phase
+
+    Attributes
+        width (int):
+        height (int):
+        order (int): The order of the parent Hilbert curve
+        hilbert_type (numpy.ndarray): Hilbert type of each block
+        x_index (numpy.ndarray): Column of each block
+        y_index (numpy.ndarray): Row of each block
+        travel_direction_to_enter (numpy.ndarray): Direction into each block
+        travel_direction_to_leave (numpy.ndarray): Direction out of each block
+        x_size (numpy.ndarray): The width of each block
+        y_size (numpy.ndarray): The height of each block
+        x_pos (numpy.ndarray): x position of the bottom left corner
+        y_pos (numpy.ndarray): y position of the bottom left corner
+        x_parity (numpy.ndarray): 1 where the width of the block is odd
+        y_parity (numpy.ndarray): 1 where the height of the block is odd
+        scan_type (numpy.ndarray): Scan type of each block
+        first_index (numpy.ndarray): Index of the first cell of each block
+                                     with the total cell count appended
+    """
+
+    # State machine tables indexed by [hilbert_type, digit]
+    child_type = None
+    child_x_bit = None
+    child_y_bit = None
+
+    # even_even_block_directions as integers, indexed by
+    # [hilbert_type, next_hilbert_type]
+    direction_codes = None
+
+    # either_odd_scan_lookup as integers, indexed by [enter, leave].  -1
+    # marks combinations missing from the lookup
+    either_odd_scan_codes = None
+
+    @classmethod
+    def build_lookup_tables(cls):
+        """Convert the lookup tables used by PseudoHilbert into arrays."""
+        cls.child_type = np.zeros((5, 4), np.int8)
+        cls.child_x_bit = np.zeros((5, 4), np.int64)
+        cls.child_y_bit = np.zeros((5, 4), np.int64)
+        for hilbert_type in range(1, 5):
+            for digit, (sub_type, x_bit, y_bit) in\
+                    enumerate(CurveDescriptor.hilbert_children[hilbert_type]):
+                cls.child_type[hilbert_type, digit] = sub_type
+                cls.child_x_bit[hilbert_type, digit] = x_bit
+                cls.child_y_bit[hilbert_type, digit] = y_bit
+
+        cls.direction_codes = np.zeros((5, 5), np.int8)
+        for first_type in range(1, 5):
+            for second_type in range(1, 5):
+                cls.direction_codes[first_type, second_type] =\
+                    PseudoHilbert.even_even_block_directions[
+                        first_type][second_type].value
+
+        cls.either_odd_scan_codes = np.full((5, 5), -1, np.int8)
+        for (enter, leave), scan_type in\
+                PseudoHilbert.either_odd_scan_lookup.items():
+            cls.either_odd_scan_codes[0 if enter is None else enter.value,
+                                      0 if leave is None else leave.value] =\
+                scan_type
+
+    def __init__(self, width, height, stats=no_build_stats):
+        """Build the table of blocks for a region.
+
+        Args:
+            width (int): The width of the arbitrary rectangular region
+            height (int): The height of the arbitrary rectangular region
+            stats (BuildStats): Optionally record the time taken by each
+                                phase
+        """
+        if np is None:
+            raise ImportError('BlockTable requires NumPy')
+        if self.child_type is None:
+            self.build_lookup_tables()
+
+        self.width = width
+        self.height = height
+        self.order = min(math.frexp(width)[1], math.frexp(height)[1]) - 2
+
+        # Regions less than four cells across are a single block
+        block_count = pow(4, max(self.order, 0))
+        cell_count = width * height
+
+        # Calculate how to divide the arbitrary rectangle into blocks
+        stats.begin_phase('division', block_count, cell_count)
+        x_plan = AxisPlan.get(width, self.order)
+        y_plan = AxisPlan.get(height, self.order)
+        x_divisions = np.array(x_plan.divisions, np.int64)
+        y_divisions = np.array(y_plan.divisions, np.int64)
+        x_offsets = np.array(x_plan.offsets[:-1], np.int64)
+        y_offsets = np.array(y_plan.offsets[:-1], np.int64)
+
+        # Order the blocks along the Hilbert curve
+        stats.begin_phase('subdivision', block_count, cell_count)
+        self.hilbert_type, self.x_index, self.y_index =\
+            self.hilbert_order(max(self.order, 0))
+
+        # Set block travel directions
+        stats.begin_phase('travel_directions', block_count, cell_count)
+        self.travel_direction_to_leave = np.zeros(block_count, np.int8)
+        self.travel_direction_to_leave[:-1] = self.direction_codes[
+            self.hilbert_type[:-1], self.hilbert_type[1:]]
+        self.travel_direction_to_enter = np.zeros(block_count, np.int8)
+        self.travel_direction_to_enter[1:] =\
+            self.travel_direction_to_leave[:-1]
+
+        # Set the size and coordinates of each block
+        stats.begin_phase('coordinates', block_count, cell_count)
+        self.x_size = x_divisions[self.x_index]
+        self.y_size = y_divisions[self.y_index]
+        self.x_pos = x_offsets[self.x_index]
+        self.y_pos = y_offsets[self.y_index]
+        self.x_parity = (self.x_size % 2).astype(np.int8)
+        self.y_parity = (self.y_size % 2).astype(np.int8)
+
+        self.first_index = np.zeros(block_count + 1, np.int64)
+        np.cumsum(self.x_size * self.y_size, out=self.first_index[1:])
+
+        # The shape of the overall arbitrary rectangle is the same as the first
+        # block as all other row and column dimensions are even.
+        stats.begin_phase('scan_types', block_count, cell_count)
+        self.scan_type = np.zeros(block_count, np.int8)
+        if self.x_parity[0] == 0 and self.y_parity[0] == 0:
+            self.set_scan_directions_even_even()
+        else:
+            self.set_scan_directions_either_odd()
+        stats.end_phase()
+
+    @classmethod
+    @lru_cache(maxsize=8)
+    def hilbert_order(cls, order):
+        """Return the hilbert type and location of every block of an order.
+
+        These depend only on the order, so they are shared between tables and
+        returned as read-only arrays.
+
+        Args:
+            order (int): The order of the parent Hilbert curve
+
+        Returns:
+            (tuple): hilbert_type, x_index and y_index arrays in curve order
+        """
+        if cls.child_type is None:
+            cls.build_lookup_tables()
+
+        # Follow the state machine from the most significant pair of bits of
+        # each block number, appending a bit to each address every order
+        block_count = pow(4, order)
+        block_numbers = np.arange(block_count, dtype=np.int64)
+        index_dtype = np.int32 if order < 31 else np.int64
+        hilbert_type = np.ones(block_count, np.int8)
+        x_index = np.zeros(block_count, index_dtype)
+        y_index = np.zeros(block_count, index_dtype)
+        for shift in range(2 * order - 2, -1, -2):
+            digits = (block_numbers >> shift) & 3
+            x_index <<= 1
+            x_index |= cls.child_x_bit[hilbert_type, digits]
+            y_index <<= 1
+            y_index |= cls.child_y_bit[hilbert_type, digits]
+            hilbert_type = cls.child_type[hilbert_type, digits]
+
+        for column in (hilbert_type, x_index, y_index):
+            column.flags.writeable = False
+        return hilbert_type, x_index, y_index
+
+    def __len__(self):
+        """Return the number of blocks."""
+        return len(self.hilbert_type)
+
+    def set_scan_directions_even_even(self):
+        """Set the scan types of blocks in an even-even region.
+
+        The array equivalent of PseudoHilbert.set_scan_directions_even_even.
+        """
+        self.scan_type[:] = self.hilbert_type
+
+    def set_scan_directions_either_odd(self):
+        """Set the scan types of blocks in non even-even regions.
+
+        The array equivalent of PseudoHilbert.set_scan_directions_either_odd.
+        """
+        self.scan_type[:] = self.either_odd_scan_codes[
+            self.travel_direction_to_enter, self.travel_direction_to_leave]
+
+        # Fix the scan types for blocks that aren't even-even
+        self.scan_type[(self.x_parity == 1) & (self.y_parity == 0)] = 8
+        self.scan_type[(self.x_parity == 0) & (self.y_parity == 1)] = 7
+
+        # The first block is a special case that has set scan types
+        # depending on the shape
+        if self.x_parity[0] == 1:
+            self.scan_type[0] = 1
+        elif self.y_parity[0] == 1:
+            self.scan_type[0] = 2
+
+        missing = np.flatnonzero(self.scan_type < 0)
+        if len(missing) > 0:
+            block = self.block(missing[0])
+            raise KeyError((block.travel_direction_to_enter,
+                            block.travel_direction_to_leave))
+
+    def block(self, block_number):
+        """Return one row of the table as a Block.
+
+        Args:
+            block_number (int): Position of the block along the curve
+
+        Returns:
+            block (Block): A Block with every attribute except its binary
+                           addresses set
+        """
+        block = Block(int(self.hilbert_type[block_number]), [], [])
+        block.x_index = int(self.x_index[block_number])
+        block.y_index = int(self.y_index[block_number])
+        for attribute in ('travel_direction_to_enter',
+                          'travel_direction_to_leave'):
+            code = int(getattr(self, attribute)[block_number])
+            setattr(block, attribute, Direction(code) if code else None)
+        block.set_size(int(self.x_size[block_number]),
+                       int(self.y_size[block_number]))
+        block.set_coordinates(int(self.x_pos[block_number]),
+                              int(self.y_pos[block_number]))
+        block.scan_type = int(self.scan_type[block_number])
+        return block
+
+    def scan_into(self, out, start=0, stop=None):
+        """Scan a contiguous range of blocks into an array.
+
+        Args:
+            out (numpy.ndarray): A (cells, 2) integer array the size of the
+                                 scanned range of blocks
+            start (int): The first block to scan
+            stop (int): One past the last block to scan, defaults to the end
+        """
+        if stop is None:
+            stop = len(self)
+        self.scan_rows_into(out,
+                            self.x_pos[start:stop], self.y_pos[start:stop],
+                            self.x_size[start:stop], self.y_size[start:stop],
+                            self.scan_type[start:stop])
+
+    def rows(self, start, stop):
+        """Return the columns needed to scan a range of blocks.
+
+        Args:
+            start (int): The first block
+            stop (int): One past the last block
+
+        Returns:
+            (tuple): x_pos, y_pos, x_size, y_size and scan_type arrays
+        """
+        return (self.x_pos[start:stop], self.y_pos[start:stop],
+                self.x_size[start:stop], self.y_size[start:stop],
+                self.scan_type[start:stop])
+
+    @staticmethod
+    def scan_rows_into(out, x_pos, y_pos, x_size, y_size, scan_type):
+        """Scan consecutive blocks given as columns into an array.
+
+        Args:
+            out (numpy.ndarray): A (cells, 2) integer array the size of the
+                                 scanned blocks
+            x_pos (numpy.ndarray): x position of each block
+            y_pos (numpy.ndarray): y position of each block
+            x_size (numpy.ndarray): Width of each block
+            y_size (numpy.ndarray): Height of each block
+            scan_type (numpy.ndarray): Scan type of each block
+        """
+        cell_counts = x_size * y_size
+        cell_starts = np.cumsum(cell_counts) - cell_counts
+
+        # Blocks sharing a size and scan type share a ScanTemplate, so every
+        # group of them is written with one scatter.  The three are packed
+        # into one integer key to group them.
+        y_size_limit = int(y_size.max()) + 1
+        keys, groups = np.unique(
+            (x_size.astype(np.int64) * y_size_limit + y_size) * 9 + scan_type,
+            return_inverse=True)
+        groups = groups.reshape(-1)
+        members_by_group = np.split(np.argsort(groups, kind='stable'),
+                                    np.cumsum(np.bincount(groups))[:-1])
+        for key, members in zip(keys.tolist(), members_by_group):
+            block_size, key_scan_type = divmod(key, 9)
+            key_x_size, key_y_size = divmod(block_size, y_size_limit)
+            template = ScanTemplate.get(key_x_size, key_y_size, key_scan_type)
+            coordinates = template.coordinates()
+            offsets = np.arange(template.cell_count)
+            # Bound the temporary arrays to about scan_batch_cells cells
+            batch_size = max(1, scan_batch_cells // template.cell_count)
+            for batch_start in range(0, len(members), batch_size):
+                batch = members[batch_start:batch_start + batch_size]
+                positions = np.stack((x_pos[batch], y_pos[batch]), 1)
+                out[(cell_starts[batch, np.newaxis] + offsets).reshape(-1)] =\
+                    (coordinates + positions[:, np.newaxis]).reshape(-1, 2)
+
+
+# The most cells BlockTable.scan_rows_into moves at a time
+scan_batch_cells = 1 << 18
+
+
+# The shared memory a fill_arrays_in_parallel worker process scans into
+shared_table_memory = None
+
+
+def set_shared_tables(tables):
+    """Hold the shared memory a worker process scans into.
+
+    Run as the initializer of each fill_arrays_in_parallel worker.
+
+    Args:
+        tables (ctypes.Array): Memory for 3 * width * height integers
+    """
+    global shared_table_memory
+    shared_table_memory = tables
+
+
+def shared_tables(tables, width, height, dtype):
+    """View shared memory as a pair of lookup tables.
+
+    Args:
+        tables (ctypes.Array): Memory for 3 * width * height integers
+        width (int): The width of the arbitrary rectangular region
+        height (int): The height of the arbitrary rectangular region
+        dtype (numpy.dtype): The integer type of the tables
+
+    Returns:
+        (tuple): coordinate_to_index and index_to_coordinate arrays
+    """
+    cell_count = width * height
+    coordinate_to_index = np.ndarray((width, height), dtype, tables)
+    index_to_coordinate = np.ndarray((cell_count, 2), dtype, tables,
+                                     cell_count * dtype.itemsize)
+    return coordinate_to_index, index_to_coordinate
+
+
+# The queue a build_many worker process sends curves back on
+result_queue = None
+
+
+def set_result_queue(queue):
+    """Set the queue a build_many worker process sends curves back on.
+
+    Args:
+        queue (queue.Queue): A queue shared through a multiprocessing manager
+    """
+    global result_queue
+    result_queue = queue
+
+
+def build_curves(shapes, backend):
+    """Build a batch of curves, run in a worker process by build_many.
+
+    Each curve is put on result_queue as soon as it's built.
+
+    Args:
+        shapes (list): (width, height) pairs of the same order
+        backend (str): The backend to build with
+    """
+    for width, height in shapes:
+        result_queue.put(((width, height),
+                          PseudoHilbert(width, height, backend)))
+
+
+def next_result(results, futures):
+    """Wait for the next curve built by build_curves.
+
+    Args:
+        results (queue.Queue): The queue the workers put curves on
+        futures (list): The build_curves tasks, checked for errors while
+                        waiting
+
+    Returns:
+        (tuple): ((width, height), curve)
+    """
+    while True:
+        try:
+            return results.get(timeout=0.1)
+        except Empty:
+            # A batch that failed won't send the rest of its curves
+            for future in futures:
+                if future.done() and future.exception() is not None:
+                    raise future.exception()
+
+
+def scan_block_range(width, height, dtype, first_index, rows):
+    """Scan a range of blocks into lookup tables held in shared memory.
+
+    Run in a worker process by PseudoHilbert.fill_arrays, after
+    set_shared_tables has handed it the memory.
+
+    Args:
+        width (int): The width of the arbitrary rectangular region
+        height (int): The height of the arbitrary rectangular region
+        dtype (str): The integer type of the tables
+        first_index (int): Index of the first cell of the range
+        rows (tuple): The range's columns from BlockTable.rows
+    """
+    coordinate_to_index, index_to_coordinate = shared_tables(
+        shared_table_memory, width, height, np.dtype(dtype))
+    x_size, y_size = rows[2], rows[3]
+    last_index = first_index + int(np.sum(x_size * y_size))
+    cells = index_to_coordinate[first_index:last_index]
+    BlockTable.scan_rows_into(cells, *rows)
+    coordinate_to_index[cells[:, 0], cells[:, 1]] =\
+        np.arange(first_index, last_index, dtype=dtype)
+
+
+class CurveCache:
+    """A least recently used cache of shared, read-only curves.
+
+    Curves are kept until their lookup tables add up to more than max_bytes,
+    then the least recently used ones are dropped.  A curve bigger than the
+    whole budget is returned without being cached.
+
+    Args
+        max_bytes (int): Memory budget for the cached lookup tables
+
+    Attributes
+        max_bytes (int):
+        current_bytes (int): Memory used by the cached lookup tables
+        hits (int): Number of requests answered from the cache
+        misses (int): Number of requests that built a new curve
+        evictions (int): Number of curves dropped to stay within budget
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        """Create an empty cache.
+
+        Args:
+            max_bytes (int): Memory budget for the cached lookup tables
+        """
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.curves = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, width, height, backend=None):
+        """Return a cached curve, building and caching it if necessary.
+
+        Args:
+            width (int): The width of the arbitrary rectangular region
+            height (int): The height of the arbitrary rectangular region
+            backend (str): 'list', 'numpy' or 'array', defaults to 'numpy'
+                           when NumPy is installed and 'array' otherwise
+
+        Returns:
+            (PseudoHilbert): A curve whose lookup tables can't be modified
+        """
+        if backend is None:
+            backend = 'array' if np is None else 'numpy'
+        key = (width, height, backend)
+
+        with self.lock:
+            if key in self.curves:
+                self.hits += 1
+                self.curves.move_to_end(key)
+                return self.curves[key][0]
+            self.misses += 1
+
+        # Build outside the lock so other sizes can be served meanwhile
+        curve = PseudoHilbert(width, height, backend)
+        curve.freeze()
+        size = curve.table_size()
+
+        with self.lock:
+            if key in self.curves or size > self.max_bytes:
+                return curve
+            self.curves[key] = (curve, size)
+            self.current_bytes += size
+            self.evict(self.max_bytes)
+        return curve
+
+    def evict(self, max_bytes):
+        """Drop least recently used curves until within a memory budget.
+
+        Args:
+            max_bytes (int): The budget to shrink to
+        """
+        while self.current_bytes > max_bytes and self.curves:
+            curve, size = self.curves.popitem(last=False)[1]
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def resize(self, max_bytes):
+        """Change the memory budget, evicting curves if it shrinks.
+
+        Args:
+            max_bytes (int): The new memory budget
+        """
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict(max_bytes)
+
+    def clear(self):
+        """Drop every cached curve and reset the counters."""
+        with self.lock:
+            self.curves.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Return the cache counters.
+
+        Returns:
+            (dict): hits, misses, evictions, curve count, current_bytes and
+                    max_bytes
+        """
+        with self.lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'curves': len(self.curves),
+                    'current_bytes': self.current_bytes,
+                    'max_bytes': self.max_bytes}
+
+
+# The cache used by PseudoHilbert.get
+curve_cache = CurveCache()
+
+
+class Tile:
+    """One tile of a TiledPseudoHilbert curve.
+
+    Each tile is traversed by a pseudo Hilbert curve of its own, the inner
+    curve, which is transposed and flipped so it starts next to where the
+    previous tile's curve finished.
+
+    Args:
+        column (int): Column of the tile in the grid of tiles
+        row (int): Row of the tile in the grid of tiles
+        x_pos (int): x position of the bottom left cell
+        y_pos (int): y position of the bottom left cell
+        x_size (int): The width of the tile
+        y_size (int): The height of the tile
+
+    Attributes:
+        column (int):
+        row (int):
+        x_pos (int):
+        y_pos (int):
+        x_size (int):
+        y_size (int):
+        transpose (bool): Swap the x and y coordinates of the inner curve,
+                          which is then built for a (y_size, x_size) region
+        flip_x (bool): Mirror the inner curve left to right
+        flip_y (bool): Mirror the inner curve top to bottom
+        first_index (int): Index of the tile's first cell along the whole
+                           curve
+    """
+
+    def __init__(self, column, row, x_pos, y_pos, x_size, y_size):
+        """Initialise a tile with an untransformed inner curve.
+
+        Args:
+            column (int): Column of the tile in the grid of tiles
+            row (int): Row of the tile in the grid of tiles
+            x_pos (int): x position of the bottom left cell
+            y_pos (int): y position of the bottom left cell
+            x_size (int): The width of the tile
+            y_size (int): The height of the tile
+        """
+        self.column = column
+        self.row = row
+        self.x_pos = x_pos
+        self.y_pos = y_pos
+        self.x_size = x_size
+        self.y_size = y_size
+        self.transpose = False
+        self.flip_x = False
+        self.flip_y = False
+        self.first_index = None
+
+    def cell_count(self):
+        """Return the number of cells in the tile.
+
+        Returns:
+            (int):
+        """
+        return self.x_size * self.y_size
+
+    def inner_shape(self):
+        """Return the (width, height) the inner curve is built for.
+
+        Returns:
+            (tuple):
+        """
+        if self.transpose:
+            return self.y_size, self.x_size
+        return self.x_size, self.y_size
+
+    def place(self, x, y):
+        """Move a cell of the inner curve to its place in the region.
+
+        Args:
+            x (int): x coordinate on the inner curve
+            y (int): y coordinate on the inner curve
+
+        Returns:
+            (tuple): (x, y) coordinates in the whole region
+        """
+        if self.transpose:
+            x, y = y, x
+        if self.flip_x:
+            x = self.x_size - 1 - x
+        if self.flip_y:
+            y = self.y_size - 1 - y
+        return self.x_pos + x, self.y_pos + y
+
+    def corners(self):
+        """Return the corner cells of the tile.
+
+        Returns:
+            (list): (x, y) tuples
+        """
+        return [self.place(x, y) for x in (0, self.x_size - 1)
+                for y in (0, self.y_size - 1)]
+
+
+class TiledPseudoHilbert:
+    """A pseudo Hilbert curve that finishes each tile before the next.
+
+    The region is cut into a grid of tiles, with narrower tiles along the
+    right and top edges when the tile size doesn't divide the region.  An
+    outer pseudo Hilbert curve orders the tiles and an inner pseudo Hilbert
+    curve orders the cells of each tile.  Each inner curve is transposed or
+    flipped so that it starts next to where the previous tile finished and
+    finishes as close as possible to the following tile.
+
+    When a tile has an odd side its inner curve doesn't finish in a corner,
+    and the following tile may start a few cells away instead of next door.
+    The tiles where this happens are listed in gaps.  Tiles with even sides
+    always join up.
+
+    Args
+        width (int): Width of the region
+        height (int): Height of the region
+        tile_width (int): Width of the tiles
+        tile_height (int): Height of the tiles, defaults to tile_width
+        backend (str): 'list', 'numpy' or 'array', see PseudoHilbert
+
+    Attributes
+        width (int):
+        height (int):
+        tile_width (int):
+        tile_height (int):
+        backend (str):
+        columns (int): Number of columns of tiles
+        rows (int): Number of rows of tiles
+        tile_curve (PseudoHilbert): The outer curve over the grid of tiles
+        tiles (list): Tiles in curve order
+        gaps (list): Numbers of the tiles whose first cell isn't next to the
+                     last cell of the tile before
+        inner_curves (dict): Inner curves by (width, height), only a few as
+                             tiles come in at most four sizes
+        coordinate_to_index: As for PseudoHilbert, for the whole region
+        index_to_coordinate: As for PseudoHilbert, for the whole region
+    """
+
+    # (transpose, flip_x, flip_y) in the order they're tried
+    transforms = tuple((transpose, flip_x, flip_y)
+                       for transpose in (False, True)
+                       for flip_y in (False, True)
+                       for flip_x in (False, True))
+
+    def __init__(self, width, height, tile_width, tile_height=None,
+                 backend='list', build_tables=True):
+        """Cut the region into tiles and join up their curves.
+
+        Args:
+            width (int): Width of the region
+            height (int): Height of the region
+            tile_width (int): Width of the tiles
+            tile_height (int): Height of the tiles, defaults to tile_width
+            backend (str): 'list', 'numpy' or 'array', how to store the
+                           lookup tables
+            build_tables (bool): If False the lookup tables are left as None
+                                 and the curve can only be walked with
+                                 iter_tiles
+        """
+        if tile_height is None:
+            tile_height = tile_width
+        if backend not in PseudoHilbert.backends:
+            raise ValueError('backend must be one of ' +
+                             str(PseudoHilbert.backends))
+        if backend == 'numpy' and np is None:
+            raise ImportError("the 'numpy' backend requires NumPy")
+        if min(width, height, tile_width, tile_height) < 1:
+            raise ValueError('sizes must be at least 1')
+
+        self.width = width
+        self.height = height
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.backend = backend
+        self.coordinate_to_index = None
+        self.index_to_coordinate = None
+
+        self.columns = -(-width // tile_width)
+        self.rows = -(-height // tile_height)
+
+        # The 'array' backend copes with a single row or column of tiles
+        self.tile_curve = PseudoHilbert(self.columns, self.rows, 'array')
+
+        self.inner_curves = {}
+        self.tiles = []
+        first_index = 0
+        for number in range(self.columns * self.rows):
+            column = self.tile_curve.index_to_coordinate[number, 0]
+            row = self.tile_curve.index_to_coordinate[number, 1]
+            x_pos = column * tile_width
+            y_pos = row * tile_height
+            tile = Tile(column, row, x_pos, y_pos,
+                        min(tile_width, width - x_pos),
+                        min(tile_height, height - y_pos))
+            tile.first_index = first_index
+            first_index += tile.cell_count()
+            self.tiles.append(tile)
+
+        self.gaps = []
+        self.set_transforms()
+
+        if build_tables:
+            self.fill_tables()
+
+    def inner_curve(self, tile):
+        """Return the shared inner curve for a tile's shape.
+
+        The curves are held by the tiler rather than curve_cache, so tiling
+        doesn't touch the counters or evict the curves of PseudoHilbert.get.
+
+        Args:
+            tile (Tile):
+
+        Returns:
+            (PseudoHilbert): A read-only curve shared by tiles of one shape
+        """
+        shape = tile.inner_shape()
+        if shape not in self.inner_curves:
+            # The 'array' backend copes with tiles one cell wide
+            curve = PseudoHilbert(*shape, 'array')
+            curve.freeze()
+            self.inner_curves[shape] = curve
+        return self.inner_curves[shape]
+
+    def inner_end(self, tile):
+        """Return the last cell of a tile's inner curve, before placing it.
+
+        Args:
+            tile (Tile):
+
+        Returns:
+            (tuple): (x, y) coordinates on the inner curve
+        """
+        cells = self.inner_curve(tile).index_to_coordinate
+        last = tile.cell_count() - 1
+        return int(cells[last, 0]), int(cells[last, 1])
+
+    def set_transforms(self):
+        """Choose how to transpose and flip the inner curve of each tile.
+
+        Each tile takes the first transform that starts closest to the
+        previous tile's last cell, breaking ties by how close it finishes to
+        a corner of the following tile.
+        """
+        def distance(cell_1, cell_2):
+            return abs(cell_1[0] - cell_2[0]) + abs(cell_1[1] - cell_2[1])
+
+        # Pretend the curve arrives from the left of the first cell
+        previous_exit = (-1, 0)
+        for number, tile in enumerate(self.tiles):  # type: Tile
+            following = None
+            if number + 1 < len(self.tiles):
+                following = self.tiles[number + 1]  # type: Tile
+
+            best = None
+            for transform in self.transforms:
+                tile.transpose, tile.flip_x, tile.flip_y = transform
+                entry = tile.place(0, 0)
+                exit_cell = tile.place(*self.inner_end(tile))
+                key = (distance(previous_exit, entry),
+                       0 if following is None else
+                       min(distance(exit_cell, corner)
+                           for corner in following.corners()))
+                if best is None or key < best[0]:
+                    best = (key, transform, exit_cell)
+
+            key, transform, exit_cell = best
+            tile.transpose, tile.flip_x, tile.flip_y = transform
+            if key[0] != 1:
+                self.gaps.append(number)
+            previous_exit = exit_cell
+
+    def tile_cells(self, tile):
+        """Return the cells of one tile in curve order.
+
+        Only the tile's inner curve is needed, so tiles can be processed
+        independently, for example in parallel.
+
+        Args:
+            tile (Tile):
+
+        Returns:
+            cells: An (n, 2) array with the 'numpy' backend, otherwise a list
+                   of [x, y] lists
+        """
+        cells = self.inner_curve(tile).index_to_coordinate
+        if self.backend == 'numpy':
+            cells = np.asarray(cells)
+            x = cells[:, 1] if tile.transpose else cells[:, 0]
+            y = cells[:, 0] if tile.transpose else cells[:, 1]
+            if tile.flip_x:
+                x = tile.x_size - 1 - x
+            if tile.flip_y:
+                y = tile.y_size - 1 - y
+            return np.stack((tile.x_pos + x, tile.y_pos + y), axis=1)
+        return [list(tile.place(x, y)) for x, y in cells.tolist()]
+
+    def iter_tiles(self):
+        """Yield each tile with its cells, in curve order.
+
+        Yields:
+            (tuple): The Tile and its cells, see tile_cells
+        """
+        for tile in self.tiles:  # type: Tile
+            yield tile, self.tile_cells(tile)
+
+    def iter_cells(self):
+        """Yield every cell of the curve in order.
+
+        Yields:
+            (list): Two element [x, y] coordinates in curve order
+        """
+        for tile, cells in self.iter_tiles():
+            if self.backend == 'numpy':
+                cells = cells.tolist()
+            yield from cells
+
+    def fill_tables(self):
+        """Build the lookup tables for the whole region, tile by tile."""
+        cell_count = self.width * self.height
+        if self.backend == 'numpy':
+            dtype = PseudoHilbert.array_dtype(cell_count)
+            self.index_to_coordinate = np.empty((cell_count, 2), dtype)
+            for tile, cells in self.iter_tiles():
+                self.index_to_coordinate[
+                    tile.first_index:
+                    tile.first_index + tile.cell_count()] = cells
+            self.coordinate_to_index = np.empty((self.width, self.height),
+                                                dtype)
+            self.coordinate_to_index[self.index_to_coordinate[:, 0],
+                                     self.index_to_coordinate[:, 1]] =\
+                np.arange(cell_count, dtype=dtype)
+        elif self.backend == 'array':
+            typecode = PseudoHilbert.array_typecode(cell_count)
+            coordinate_to_index = array(typecode, [0]) * cell_count
+            index_to_coordinate = array(typecode, [0]) * (2 * cell_count)
+            for index, (x, y) in enumerate(self.iter_cells()):
+                coordinate_to_index[x * self.height + y] = index
+                index_to_coordinate[2 * index] = x
+                index_to_coordinate[2 * index + 1] = y
+            self.coordinate_to_index = memoryview(coordinate_to_index).cast(
+                'B').cast(typecode, (self.width, self.height))
+            self.index_to_coordinate = memoryview(index_to_coordinate).cast(
+                'B').cast(typecode, (cell_count, 2))
+        else:
+            self.coordinate_to_index =\
+                [[None] * self.height for column in range(self.width)]
+            self.index_to_coordinate = list(self.iter_cells())
+            for index, (x, y) in enumerate(self.index_to_coordinate):
+                self.coordinate_to_index[x][y] = index
+
+
+# Vertices formatted and written at a time by the exporters
+export_chunk_size = 4096
+
+
+def iter_vertices(width, height):
+    """Yield the cells where a pseudo Hilbert curve turns.
+
+    The first and last cells of the curve are included, and runs of collinear
+    cells between them are left out, so a line drawn through the vertices in
+    order passes through every cell.  Blocks are built one at a time by a
+    CurveDescriptor, so memory doesn't grow with the size of the region.
+
+    Args:
+        width (int): The width of the arbitrary rectangular region
+        height (int): The height of the arbitrary rectangular region
+
+    Yields:
+        (tuple): (x, y) of each vertex in curve order
+    """
+    x_steps = ChainCode.x_steps
+    y_steps = ChainCode.y_steps
+    x = y = 0
+    yield x, y
+    blocks = CurveDescriptor(width, height).iter_blocks()
+    for direction, length in ChainCode.iter_segments(blocks):
+        x += x_steps[direction] * length
+        y += y_steps[direction] * length
+        yield x, y
+
+
+def iter_vertex_chunks(width, height, chunk_size=export_chunk_size):
+    """Yield the vertices of a curve in lists of a fixed size.
+
+    Args:
+        width (int): The width of the arbitrary rectangular region
+        height (int): The height of the arbitrary rectangular region
+        chunk_size (int): The most vertices in each list
+
+    Yields:
+        (list): (x, y) vertices, only the last list can be shorter
+    """
+    vertices = iter_vertices(width, height)
+    chunk = list(islice(vertices, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(vertices, chunk_size))
+
+
+def export_svg(file, width, height, stroke_width=0.3,
+               chunk_size=export_chunk_size):
+    """Write a curve as an SVG drawing of polylines.
+
+    Cells are one unit squares with y increasing upwards, the curve passing
+    through their centres on a white background.  Each chunk of vertices is
+    one polyline starting at the last vertex of the one before, with round
+    joins and caps so the line looks unbroken.
+
+    Args:
+        file (file object): Opened for writing text
+        width (int): The width of the arbitrary rectangular region
+        height (int): The height of the arbitrary rectangular region
+        stroke_width (float): Width of the line in cells
+        chunk_size (int): The most vertices in each polyline
+
+    Returns:
+        (int): The number of vertices written
+    """
+    file.write('<?xml version="1.0" encoding="utf-8" ?>\n'
+               '<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+               'width="{0}px" height="{1}px" viewBox="0 0 {0} {1}">\n'
+               '<rect x="0" y="0" width="{0}" height="{1}" '
+               'fill="rgb(255,255,255)" />\n'.format(width, height))
+    polyline = ('<polyline fill="none" stroke="rgb(0,0,0)" '
+                'stroke-linecap="round" stroke-linejoin="round" '
+                'stroke-width="' + str(stroke_width) + '" points="')
+
+    vertex_count = 0
+    last_point = None
+    for chunk in iter_vertex_chunks(width, height, chunk_size):
+        points = [str(x + 0.5) + ',' + str(height - y - 0.5)
+                  for x, y in chunk]
+        vertex_count += len(points)
+        if last_point is not None:
+            points.insert(0, last_point)
+        last_point = points[-1]
+        # A one cell region is drawn as a dot
+        if len(points) == 1:
+            points.append(points[0])
+        file.write(polyline + ' '.join(points) + '" />\n')
+    file.write('</svg>\n')
+    return vertex_count
+
+
+def export_binary(file, width, height, typecode=None,
+                  chunk_size=export_chunk_size):
+    """Write the vertices of a curve as a raw stream of coordinates.
+
+    Vertices are written as x, y pairs of little endian signed integers
+    with no header, so the stream can be read back with
+    numpy.fromfile(path, '<i4').reshape(-1, 2).
+
+    Args:
+        file (file object): Opened for writing bytes
+        width (int): The width of the arbitrary rectangular region
+        height (int): The height of the arbitrary rectangular region
+        typecode (str): array typecode for the coordinates, 'i' (four bytes)
+                        unless a side is too long for it
+        chunk_size (int): The most vertices in each write
+
+    Returns:
+        (int): The number of vertices written
+    """
+    if typecode is None:
+        typecode = PseudoHilbert.array_typecode(max(width, height))
+    vertex_count = 0
+    for chunk in iter_vertex_chunks(width, height, chunk_size):
+        coordinates = array(typecode, [coordinate for vertex in chunk
+                                       for coordinate in vertex])
+        if sys.byteorder == 'big':
+            coordinates.byteswap()
+        file.write(coordinates.tobytes())
+        vertex_count += len(chunk)
+    return vertex_count
+
+
+def export_csv(file, width, height, header=True,
+               chunk_size=export_chunk_size):
+    """Write the vertices of a curve as comma separated x,y lines.
+
+    Args:
+        file (file object): Opened for writing text
+        width (int): The width of the arbitrary rectangular region
+        height (int): The height of the arbitrary rectangular region
+        header (bool): Start with an x,y header line
+        chunk_size (int): The most vertices in each write
+
+    Returns:
+        (int): The number of vertices written
+    """
+    if header:
+        file.write('x,y\n')
+    vertex_count = 0
+    for chunk in iter_vertex_chunks(width, height, chunk_size):
+        file.write(''.join(str(x) + ',' + str(y) + '\n' for x, y in chunk))
+        vertex_count += len(chunk)
+    return vertex_count
+
+
+# Formats and tables the command line generator can write
+table_formats = ('npy', 'bin', 'csv')
+table_names = {'forward': ('index_to_coordinate',),
+               'inverse': ('coordinate_to_index',),
+               'both': ('index_to_coordinate', 'coordinate_to_index')}
+
+# Integers written at a time by the command line generator
+table_chunk_size = 1 << 16
+
+
+def fastest_backend():
+    """Return the fastest backend that can be used.
+
+    Returns:
+        (str): 'numpy' when NumPy is installed and 'array' otherwise
+    """
+    return 'array' if np is None else 'numpy'
+
+
+def flat_table(curve, name):
+    """Return one of a curve's lookup tables as a flat run of integers.
+
+    Args:
+        curve (PseudoHilbert): A curve built with the 'numpy' or 'array'
+                               backend
+        name (str): 'index_to_coordinate' or 'coordinate_to_index'
+
+    Returns:
+        (tuple): A one dimensional memoryview of native integers in row
+                 major order and the shape of the table
+    """
+    table = getattr(curve, name)
+    if curve.backend == 'numpy':
+        table = memoryview(np.ascontiguousarray(table))
+    return table.cast('B').cast(table.format), table.shape
+
+
+def npy_header(itemsize, shape):
+    """Build the header of a version 1.0 .npy file of native integers.
+
+    Args:
+        itemsize (int): Bytes per integer
+        shape (tuple): The shape of the array
+
+    Returns:
+        (bytes): Magic string, version, header length and the header
+                 dictionary padded so the data is 64 byte aligned
+    """
+    descr = ('<' if sys.byteorder == 'little' else '>') + 'i' + str(itemsize)
+    header = ("{'descr': '" + descr + "', 'fortran_order': False, "
+              "'shape': " + repr(tuple(shape)) + ", }")
+    header += ' ' * (-(10 + len(header) + 1) % 64) + '\n'
+    return (b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) +
+            header.encode('latin1'))
+
+
+def table_chunks(curve, name, chunk_size):
+    """Yield one of a curve's lookup tables a few rows at a time.
+
+    A curve built with build_tables=False has no tables, but its
+    index_to_coordinate can still be scanned block by block with
+    iter_blocks, or a range of blocks at a time from a BlockTable with the
+    'numpy' backend, which only holds the blocks.
+
+    Args:
+        curve (PseudoHilbert): A curve with the 'numpy' or 'array' backend
+        name (str): 'index_to_coordinate' or 'coordinate_to_index'
+        chunk_size (int): About the most integers in a chunk, a chunk of
+                          blocks can go over by one block
+
+    Yields:
+        (memoryview): One dimensional runs of native integers holding whole
+                      rows of the table
+    """
+    if getattr(curve, name) is not None:
+        values, shape = flat_table(curve, name)
+        row_size = shape[1]
+        step = max(row_size, chunk_size - chunk_size % row_size)
+        for start in range(0, len(values), step):
+            yield values[start:start + step]
+        return
+    if name != 'index_to_coordinate':
+        raise ValueError(name + ' needs a curve built with its tables')
+
+    if curve.backend == 'numpy':
+        # Scan whole ranges of blocks at a time rather than one block, each
+        # range starting with the block holding a multiple of chunk_size / 2
+        # cells
+        cell_count = curve.width * curve.height
+        block_table = BlockTable(curve.width, curve.height)
+        boundaries = np.searchsorted(
+            block_table.first_index,
+            np.arange(0, cell_count, max(1, chunk_size // 2)), 'right') - 1
+        boundaries = np.unique(boundaries).tolist() + [len(block_table)]
+        first_index = block_table.first_index.tolist() + [cell_count]
+        for start, stop in zip(boundaries, boundaries[1:]):
+            cells = np.empty((first_index[stop] - first_index[start], 2),
+                             curve.array_dtype(cell_count))
+            block_table.scan_into(cells, start, stop)
+            yield memoryview(cells.reshape(-1))
+        return
+
+    pending = bytearray()
+    for cells in curve.iter_blocks():
+        cells = memoryview(cells)
+        pending += cells
+        if len(pending) >= chunk_size * cells.itemsize:
+            yield memoryview(pending).cast(cells.format)
+            pending = bytearray()
+    if pending:
+        yield memoryview(pending).cast(cells.format)
+
+
+def write_table(file, curve, name, table_format,
+                chunk_size=table_chunk_size):
+    """Write one of a curve's lookup tables a chunk at a time.
+
+    'npy'    A .npy file holding the table with its shape
+    'bin'    The table's integers in row major order, little endian, with
+             no header
+    'csv'    One line per row of the table, x,y for index_to_coordinate
+             and the height indices of one column for coordinate_to_index
+
+    Args:
+        file (file object): Opened for writing bytes
+        curve (PseudoHilbert): A curve with the 'numpy' or 'array' backend.
+                               index_to_coordinate is streamed from the
+                               blocks if it was built with build_tables=False
+        name (str): 'index_to_coordinate' or 'coordinate_to_index'
+        table_format (str): 'npy', 'bin' or 'csv'
+        chunk_size (int): The most integers written at a time, rounded down
+                          to whole rows of the table
+
+    Returns:
+        (int): The number of bytes written
+    """
+    if table_format not in table_formats:
+        raise ValueError('table_format must be one of ' + str(table_formats))
+    if name == 'index_to_coordinate':
+        shape = (curve.width * curve.height, 2)
+    else:
+        shape = (curve.width, curve.height)
+    row_size = shape[1]
+
+    chunks = table_chunks(curve, name, chunk_size)
+    first_chunk = next(chunks)
+    byte_count = 0
+    if table_format == 'npy':
+        header = npy_header(first_chunk.itemsize, shape)
+        file.write(header)
+        byte_count += len(header)
+    for chunk in chain((first_chunk,), chunks):
+        if table_format == 'csv':
+            numbers = [str(value) for value in chunk.tolist()]
+            data = ''.join(','.join(numbers[row:row + row_size]) + '\n'
+                           for row in range(0, len(numbers),
+                                            row_size)).encode('ascii')
+        elif table_format == 'bin' and sys.byteorder == 'big':
+            swapped = array(chunk.format, chunk.tobytes())
+            swapped.byteswap()
+            data = swapped.tobytes()
+        else:
+            data = chunk
+        file.write(data)
+        byte_count += memoryview(data).nbytes
+    return byte_count
+
+
+def peak_memory():
+    """Return the peak resident set size of the process.
+
+    Tracing allocations with tracemalloc slows building a curve down many
+    times over, so the operating system's figure is used instead.
+
+    Returns:
+        (int): Bytes, or None if the resource module isn't available
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def main(arguments=None):
+    """Generate a curve and write its lookup tables.
+
+    The tables are written to a file, or stdout, in the order forward
+    (index_to_coordinate) then inverse (coordinate_to_index).  Two .npy
+    tables in one file can be read with consecutive numpy.load calls.  The
+    forward table on its own is streamed from the blocks, so the curve's
+    tables are never held.  Timings and the peak memory of the process go to
+    stderr.
+
+        python -m PseudoHilbert 1000 750 --format npy --output curve.npy
+        python -m PseudoHilbert 1000 750 --format bin --table inverse | ...
+
+    Args:
+        arguments (list): Command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('width', type=int)
+    parser.add_argument('height', type=int)
+    parser.add_argument('--format', choices=table_formats, default='npy')
+    parser.add_argument('--table', choices=tuple(table_names),
+                        default='both')
+    parser.add_argument('--output', help='file to write, default stdout')
+    parser.add_argument('--backend', choices=('numpy', 'array'),
+                        default=fastest_backend())
+    parser.add_argument('--chunk-size', type=int, default=table_chunk_size,
+                        help='integers written at a time')
+    options = parser.parse_args(arguments)
+    if options.width < 1 or options.height < 1:
+        parser.error('width and height must be at least 1')
+
+    # The forward table alone is streamed from the blocks, only the inverse
+    # table needs the whole curve built
+    names = table_names[options.table]
+    start = time.perf_counter()
+    curve = PseudoHilbert(options.width, options.height, options.backend,
+                          build_tables='coordinate_to_index' in names)
+    build_seconds = time.perf_counter() - start
+    print('built', options.width, 'x', options.height, 'with',
+          options.backend, 'in', round(build_seconds, 3), 's',
+          file=sys.stderr)
+
+    start = time.perf_counter()
+    if options.output:
+        file = open(options.output, 'wb')
+    else:
+        file = sys.stdout.buffer
+    try:
+        byte_count = sum(write_table(file, curve, name, options.format,
+                                     options.chunk_size)
+                         for name in names)
+        file.flush()
+    finally:
+        if options.output:
+            file.close()
+    write_seconds = time.perf_counter() - start
+
+    print('wrote', byte_count, 'bytes in', round(write_seconds, 3), 's',
+          file=sys.stderr)
+    peak = peak_memory()
+    if peak is not None:
+        print('peak memory', peak, 'bytes', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,598 @@
+"""
+Generate pseudo Hilbert curves for arbitrary box shaped volumes.
+
+The three dimensional counterpart of PseudoHilbert.  Each side of the volume
+is divided into 2 ** order blocks with PseudoHilbert.division, exactly as the
+sides of a rectangle are, and a three dimensional Hilbert curve is used to
+traverse the blocks.  The cells of each block are traversed with a
+three dimensional bidirectional raster scan (a snake that reverses direction
+at the end of every line and every layer).  The scan of each block starts in
+the corner next to where the scan of the previous block finished, so
+consecutive cells along the curve always share a face.
+
+The corner each block is entered by comes from the Hilbert curve of the
+next order, which visits the 8 cells nearest the corners of every block one
+after another.  It leaves each block across from where it came in along a
+single axis, and a snake through a block with even sides that scans that axis
+slowest does the same.  Only the first block along each side has an odd
+length, so the last layer of cells along every odd side is peeled off and the
+remaining volume is covered by blocks with even sides.  The peeled layers are
+scanned last, each as a single one cell thick block.
+
+Coordinate system
+   +z
+   |  +y
+   | /
+   |/
+   o----+x
+
+(x,y,z)
+unless specified otherwise, coordinates follow a (width, height, depth)
+pattern
+"""
+import math
+from functools import lru_cache
+
+from PseudoHilbert import AxisPlan, scan_batch_cells
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional and only needed by the array backend
+    np = None
+
+
+def hilbert_cells(distances, order):
+    """Return the cells at some distances along a three dimensional Hilbert
+    curve.
+
+    Uses John Skilling's transpose algorithm ("Programming the Hilbert
+    curve", 2004).  The curve starts at cell (0, 0, 0) and finishes at cell
+    (2 ** order - 1, 0, 0).  The algorithm is written without branches so
+    that distances can be an int or a NumPy integer array.
+
+    Args:
+        distances (int): Distances along the curve, or an array of them
+        order (int): The order of the Hilbert curve
+
+    Returns:
+        (list): The x, y and z of the cells, each of the same kind as
+                distances
+    """
+    # Deinterleave the bits of the distance into the transposed form
+    axes = [0, 0, 0]
+    for bit in range(order):
+        for axis in range(3):
+            shift = 3 * bit + 2 - axis
+            axes[axis] = axes[axis] | ((distances >> shift) & 1) << bit
+
+    # Gray decode
+    t = axes[2] >> 1
+    axes[2] = axes[2] ^ axes[1]
+    axes[1] = axes[1] ^ axes[0]
+    axes[0] = axes[0] ^ t
+
+    # Undo excess work.  Where the bit of an axis is set the bits below it
+    # in the first axis are inverted, elsewhere they are exchanged with the
+    # axis.
+    for bit in range(1, order):
+        p = (1 << bit) - 1
+        for axis in range(2, -1, -1):
+            invert = ((axes[axis] >> bit) & 1) * p
+            t = (axes[0] ^ axes[axis]) & (p ^ invert)
+            axes[0] = axes[0] ^ invert ^ t
+            axes[axis] = axes[axis] ^ t
+    return axes
+
+
+@lru_cache(maxsize=8)
+def hilbert_block_corners(order):
+    """Return the blocks of a three dimensional Hilbert curve in order with
+    the corners the curve enters them by.
+
+    The curve of order + 1 passes through the 8 cells of each block of the
+    curve of order one after another.  Its first cell in a block is the
+    corner the block is entered by and its last cell is the corner next to
+    the following block.  Those two corners are always one step apart, so
+    the curve leaves a block across the block from where it came in along a
+    single axis.
+
+    Args:
+        order (int): The order of the Hilbert curve of blocks
+
+    Returns:
+        (tuple): 8 ** order (indices, corner, axis) tuples, where indices is
+                 the (x_index, y_index, z_index) of the block, corner is 0 or
+                 1 on each axis for the low or high side the block is
+                 entered on and axis is the one the block is crossed along
+    """
+    if np is not None:
+        distances = np.arange(pow(8, order), dtype=np.int64) * 8
+        entries = np.transpose(hilbert_cells(distances, order + 1)).tolist()
+        exits = np.transpose(hilbert_cells(distances + 7, order + 1)).tolist()
+    else:
+        distances = range(0, pow(8, order + 1), 8)
+        entries = [hilbert_cells(distance, order + 1)
+                   for distance in distances]
+        exits = [hilbert_cells(distance + 7, order + 1)
+                 for distance in distances]
+
+    blocks = []
+    for entry, exit_cell in zip(entries, exits):
+        blocks.append((tuple(value >> 1 for value in entry),
+                       tuple(value & 1 for value in entry),
+                       [(low ^ high) & 1 for low, high
+                        in zip(entry, exit_cell)].index(1)))
+    return tuple(blocks)
+
+
+class Block3D:
+    """A box of cells scanned with a three dimensional bidirectional raster.
+
+    Args:
+        position (tuple): (x, y, z) of the cell with the lowest coordinates
+        size (tuple): The (x, y, z) side lengths of the block
+
+    Attributes:
+        position (tuple):
+        size (tuple):
+        entry (tuple): The (x, y, z) corner cell the scan starts in
+        scan_axes (tuple): The axes to scan along from the fastest changing
+                           to the slowest changing, for example (0, 1, 2)
+                           scans lines along x, then layers along y
+    """
+
+    def __init__(self, position, size):
+        """Initialise a block that hasn't had its scan chosen yet.
+
+        Args:
+            position (tuple): (x, y, z) of the cell with the lowest
+                              coordinates
+            size (tuple): The (x, y, z) side lengths of the block
+        """
+        self.position = tuple(position)
+        self.size = tuple(size)
+        self.entry = None
+        self.scan_axes = None
+
+    @staticmethod
+    def scan_axes_crossing(axis):
+        """Return the scan axes that cross the block once along an axis.
+
+        Scanning the axis slowest means a block with even sides is left on
+        the far side of that axis and on the same side of the others.
+
+        Args:
+            axis (int): The axis to cross, 0 for x, 1 for y and 2 for z
+
+        Returns:
+            (tuple): Axes from the fastest to the slowest changing
+        """
+        return tuple(other for other in range(3) if other != axis) + (axis,)
+
+    def exit(self, entry, scan_axes):
+        """Return the cell a scan finishes in.
+
+        Args:
+            entry (tuple): The (x, y, z) corner cell the scan starts in
+            scan_axes (tuple): Axes from the fastest to the slowest changing
+
+        Returns:
+            (tuple): (x, y, z) coordinates of the last cell
+        """
+        fast, middle, slow = scan_axes
+        exit_cell = list(entry)
+
+        # The slowest axis is crossed once, the others once per line or layer
+        crossings = {slow: 1,
+                     middle: self.size[slow],
+                     fast: self.size[slow] * self.size[middle]}
+        for axis, count in crossings.items():
+            if count % 2 == 1:
+                low = self.position[axis]
+                high = low + self.size[axis] - 1
+                exit_cell[axis] = low + high - entry[axis]
+        return tuple(exit_cell)
+
+    def scan(self):
+        """Scan the block from its entry corner.
+
+        Returns
+            coordinates (list): A list of three element lists containing
+                                (x,y,z) coordinates
+        """
+        fast, middle, slow = self.scan_axes
+        steps = [1 if self.entry[axis] == self.position[axis] else -1
+                 for axis in range(3)]
+
+        coordinates = []
+        cell = list(self.entry)
+        for layer in range(self.size[slow]):
+            for line in range(self.size[middle]):
+                for count in range(self.size[fast]):
+                    coordinates.append(list(cell))
+                    cell[fast] += steps[fast]
+                # Step back inside the block and reverse direction
+                cell[fast] -= steps[fast]
+                steps[fast] = -steps[fast]
+                cell[middle] += steps[middle]
+            cell[middle] -= steps[middle]
+            steps[middle] = -steps[middle]
+            cell[slow] += steps[slow]
+        return coordinates
+
+    def scan_into(self, out):
+        """Scan the block into a preallocated NumPy array.
+
+        Produces the same cells as scan() using array arithmetic.
+
+        Args
+            out (numpy.ndarray): A (cell count, 3) integer array, usually a
+                                 slice of a larger output, that receives the
+                                 (x,y,z) coordinates
+        """
+        fast, middle, slow = self.scan_axes
+        slow_size = self.size[slow]
+        middle_size = self.size[middle]
+        fast_size = self.size[fast]
+        counts = np.indices((slow_size, middle_size, fast_size))
+        slow_count, middle_count, fast_count = counts
+
+        # Lines run backwards on every other layer and cells on every other
+        # line
+        middle_count = np.where(slow_count % 2 == 1,
+                                middle_size - 1 - middle_count, middle_count)
+        line = slow_count * middle_size + counts[1]
+        fast_count = np.where(line % 2 == 1,
+                              fast_size - 1 - fast_count, fast_count)
+
+        for axis, count in ((slow, slow_count), (middle, middle_count),
+                            (fast, fast_count)):
+            if self.entry[axis] == self.position[axis]:
+                out[:, axis] = (self.position[axis] + count).ravel()
+            else:
+                out[:, axis] = (self.entry[axis] - count).ravel()
+
+
+class PseudoHilbert3D:
+    """Hold information about and generate three dimensional pseudo Hilbert
+    curves.
+
+    The curve starts in cell (0, 0, 0) and visits every cell of the volume,
+    with each cell sharing a face with the cell before it.
+
+    Args
+        width (int): x length of the volume
+        height (int): y length of the volume
+        depth (int): z length of the volume
+        backend (str): 'list' (default) for nested Python lists or 'numpy' for
+                       NumPy arrays
+
+    Attributes
+        width (int):
+        height (int):
+        depth (int):
+        backend (str): The backend used to store the lookup tables
+        order (int): The order of the Hilbert curve that orders the blocks
+        coordinate_to_index (list): A 3D list of lists to look up the index
+                                    from coordinates.  With the 'numpy'
+                                    backend this is a (width, height, depth)
+                                    integer array
+        index_to_coordinate (list): A list of three element (x,y,z) list
+                                    coordinates to lookup the coordinates
+                                    from an index.  With the 'numpy' backend
+                                    this is an (N, 3) integer array
+    """
+
+    backends = ('list', 'numpy')
+
+    def __init__(self, width, height, depth, backend='list',
+                 build_tables=True):
+        """Initialise and generate a three dimensional pseudo Hilbert curve.
+
+        Args:
+            width (int): x length of the volume
+            height (int): y length of the volume
+            depth (int): z length of the volume
+            backend (str): 'list' or 'numpy', how to store the lookup tables
+            build_tables (bool): If False the lookup tables are left as None
+                                 and the curve can only be walked with
+                                 iter_blocks or iter_cells
+        """
+        if backend not in self.backends:
+            raise ValueError('backend must be one of ' + str(self.backends))
+        if backend == 'numpy' and np is None:
+            raise ImportError("the 'numpy' backend requires NumPy")
+        if min(width, height, depth) < 1:
+            raise ValueError('every side of the volume must be at least 1')
+
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.backend = backend
+        self.coordinate_to_index = None
+        self.index_to_coordinate = None
+
+        # As in two dimensions, but thin volumes are scanned as a single
+        # block rather than rejected
+        self.order = max(min(math.frexp(self.width)[1],
+                             math.frexp(self.height)[1],
+                             math.frexp(self.depth)[1]) - 2, 0)
+
+        if not build_tables:
+            return
+
+        if self.backend == 'numpy':
+            self.fill_arrays()
+        else:
+            self.fill_lists(self.build_block_list())
+
+    @property
+    def shape(self):
+        """(tuple): The (width, height, depth) of the volume"""
+        return self.width, self.height, self.depth
+
+    @classmethod
+    def iter_coordinates(cls, width, height, depth):
+        """Yield the cells of a curve in order without building its tables.
+
+        Args:
+            width (int): x length of the volume
+            height (int): y length of the volume
+            depth (int): z length of the volume
+
+        Yields:
+            (list): Three element [x, y, z] coordinates in curve order
+        """
+        return cls(width, height, depth, build_tables=False).iter_cells()
+
+    def iter_cells(self):
+        """Yield every cell of the curve in order.
+
+        Only the block list is held in memory, not the full lookup tables.
+
+        Yields:
+            (list): Three element [x, y, z] coordinates in curve order
+        """
+        for block_cells in self.iter_blocks():
+            yield from block_cells
+
+    def iter_blocks(self):
+        """Yield the cells of each block in curve order.
+
+        With the 'numpy' backend each chunk is an (n, 3) array, otherwise it
+        is a list of [x, y, z] lists.
+
+        Yields:
+            (list): The scanned cells of one block
+        """
+        for block in self.build_block_list():  # type: Block3D
+            if self.backend == 'numpy':
+                cells = np.empty((math.prod(block.size), 3),
+                                 self.array_dtype())
+                block.scan_into(cells)
+                yield cells
+            else:
+                yield block.scan()
+
+    def array_dtype(self):
+        """Return the smallest NumPy integer type able to index the cells.
+
+        Returns:
+            (numpy.dtype): int32 if every index fits, int64 otherwise
+        """
+        if self.width * self.height * self.depth <= np.iinfo(np.int32).max:
+            return np.dtype(np.int32)
+        return np.dtype(np.int64)
+
+    def peeled_axes(self):
+        """Return the axes whose last layer of cells is scanned separately.
+
+        Every odd side is peeled, so that every block has even sides.  A
+        curve of order 0 is a single block and needs no peeling.
+
+        Returns:
+            (list): Axis numbers, 0 for x, 1 for y and 2 for z
+        """
+        if self.order == 0:
+            return []
+        return [axis for axis, length in enumerate(self.shape)
+                if length % 2 == 1]
+
+    def core(self):
+        """Return the part of the volume covered by blocks.
+
+        Returns:
+            (tuple): The peeled axes, the (x, y, z) side lengths left once
+                     they are peeled and the axes in the order the Hilbert
+                     curve of blocks uses them
+        """
+        peeled = self.peeled_axes()
+        core_shape = tuple(length - (axis in peeled)
+                           for axis, length in enumerate(self.shape))
+
+        # The block curve finishes on the high side of its first axis, so
+        # line that up with the first peeled layer
+        first_axis = peeled[0] if peeled else 0
+        axis_order = [first_axis] + [axis for axis in range(3)
+                                     if axis != first_axis]
+        return peeled, core_shape, axis_order
+
+    def build_block_list(self):
+        """Divide the volume into blocks, order them and choose their scans.
+
+        Returns:
+            block_list (list): Block3D objects in curve order with their
+                               entry corner and scan axes set
+        """
+        peeled, core_shape, axis_order = self.core()
+        plans = [AxisPlan.get(length, self.order) for length in core_shape]
+
+        # Every block is entered on the corner the Hilbert curve of the next
+        # order enters it by and crossed along one axis, which leaves it on
+        # the corner next to the following block
+        block_list = []
+        for hilbert_indices, hilbert_corner, hilbert_axis in\
+                hilbert_block_corners(self.order):
+            indices = [0, 0, 0]
+            corner = [0, 0, 0]
+            for number, axis in enumerate(axis_order):
+                indices[axis] = hilbert_indices[number]
+                corner[axis] = hilbert_corner[number]
+            block = Block3D(
+                [plans[axis].offsets[indices[axis]] for axis in range(3)],
+                [plans[axis].divisions[indices[axis]] for axis in range(3)])
+            block.entry = tuple(
+                block.position[axis] + corner[axis] * (block.size[axis] - 1)
+                for axis in range(3))
+            block.scan_axes =\
+                Block3D.scan_axes_crossing(axis_order[hilbert_axis])
+            block_list.append(block)
+
+        block_list.extend(self.peeled_blocks(peeled, core_shape, axis_order))
+        return block_list
+
+    def peeled_blocks(self, peeled, core_shape, axis_order):
+        """Return the peeled layers as one cell thick blocks in curve order.
+
+        The blocks finish in the corner on the high side of the first axis
+        of axis_order and the low side of the others, next to the first
+        layer.  Each layer is crossed along the axis of the next one, and as
+        its sides are even apart from the layers before it, that leaves it
+        next to a corner of the next layer.
+
+        Args:
+            peeled (list): The peeled axes, see peeled_axes
+            core_shape (tuple): The side lengths covered by blocks
+            axis_order (list): The axes in the order the Hilbert curve of
+                               blocks uses them
+
+        Returns:
+            (list): A Block3D with its scan set for each peeled layer
+        """
+        exit_cell = [0, 0, 0]
+        exit_cell[axis_order[0]] = core_shape[axis_order[0]] - 1
+
+        # Each peeled layer covers the full length of the layers peeled
+        # before it
+        block_list = []
+        for number, peeled_axis in enumerate(peeled):
+            position = [0, 0, 0]
+            size = list(core_shape)
+            position[peeled_axis] = self.shape[peeled_axis] - 1
+            size[peeled_axis] = 1
+            for axis in peeled[:number]:
+                size[axis] = self.shape[axis]
+            block = Block3D(position, size)
+            exit_cell[peeled_axis] += 1
+            block.entry = tuple(exit_cell)
+            if number + 1 < len(peeled):
+                block.scan_axes =\
+                    Block3D.scan_axes_crossing(peeled[number + 1])
+            else:
+                block.scan_axes = Block3D.scan_axes_crossing(peeled_axis)
+            exit_cell = list(block.exit(block.entry, block.scan_axes))
+            block_list.append(block)
+        return block_list
+
+    def fill_lists(self, block_list):
+        """Scan every block and fill the lookup tables as Python lists.
+
+        Args:
+            block_list (list): Block3D objects in curve order
+        """
+        self.coordinate_to_index = [[[None] * self.depth
+                                     for j in range(self.height)]
+                                    for i in range(self.width)]
+        self.index_to_coordinate = []
+
+        counter = 0
+        for block in block_list:  # type: Block3D
+            for cell in block.scan():
+                self.coordinate_to_index[cell[0]][cell[1]][cell[2]] = counter
+                self.index_to_coordinate.append(cell)
+                counter += 1
+
+    def fill_arrays(self):
+        """Scan every block and fill the lookup tables as NumPy arrays."""
+        dtype = self.array_dtype()
+        cell_count = self.width * self.height * self.depth
+        index_to_coordinate = np.empty((cell_count, 3), dtype)
+
+        peeled, core_shape, axis_order = self.core()
+        first_index = self.scan_blocks_into(index_to_coordinate, core_shape,
+                                            axis_order)
+        for block in self.peeled_blocks(peeled, core_shape, axis_order):
+            last_index = first_index + math.prod(block.size)
+            block.scan_into(index_to_coordinate[first_index:last_index])
+            first_index = last_index
+
+        coordinate_to_index = np.empty(self.shape, dtype)
+        coordinate_to_index[tuple(index_to_coordinate.T)] =\
+            np.arange(cell_count, dtype=dtype)
+        self.index_to_coordinate = index_to_coordinate
+        self.coordinate_to_index = coordinate_to_index
+
+    def scan_blocks_into(self, out, core_shape, axis_order):
+        """Scan the blocks, without the peeled layers, into an array.
+
+        Finds the blocks of build_block_list for every block at once.
+        Blocks sharing a size, entry corner and crossing axis share a scan
+        relative to their position, so every group of them is written with
+        one scatter.
+
+        Args:
+            out (numpy.ndarray): A (cells, 3) integer array starting with
+                                 the cells of the blocks
+            core_shape (tuple): The side lengths covered by blocks
+            axis_order (list): The axes in the order the Hilbert curve of
+                               blocks uses them
+
+        Returns:
+            (int): The number of cells scanned
+        """
+        distances = np.arange(pow(8, self.order), dtype=np.int64) * 8
+        entry = hilbert_cells(distances, self.order + 1)
+        exit_cell = hilbert_cells(distances + 7, self.order + 1)
+
+        positions = np.empty((len(distances), 3), np.int64)
+        sizes = np.empty((len(distances), 3), np.int64)
+        corners = np.empty((len(distances), 3), np.int64)
+        crossing = np.empty(len(distances), np.int64)
+        for number, axis in enumerate(axis_order):
+            plan = AxisPlan.get(core_shape[axis], self.order)
+            indices = entry[number] >> 1
+            positions[:, axis] = np.asarray(plan.offsets)[indices]
+            sizes[:, axis] = np.asarray(plan.divisions)[indices]
+            corners[:, axis] = entry[number] & 1
+            crossing[((entry[number] ^ exit_cell[number]) & 1) == 1] = axis
+
+        cell_counts = sizes.prod(axis=1)
+        cell_starts = np.cumsum(cell_counts) - cell_counts
+
+        # Pack the size, corner and crossing axis into one integer key to
+        # group the blocks
+        size_limit = int(sizes.max()) + 1
+        groups = np.unique(
+            ((sizes @ [size_limit ** 2, size_limit, 1]) * 8 +
+             corners @ [4, 2, 1]) * 3 + crossing,
+            return_inverse=True)[1].reshape(-1)
+        members_by_group = np.split(np.argsort(groups, kind='stable'),
+                                    np.cumsum(np.bincount(groups))[:-1])
+        for members in members_by_group:
+            first = members[0]
+            template = Block3D((0, 0, 0), sizes[first].tolist())
+            template.entry = tuple((corners[first] *
+                                    (sizes[first] - 1)).tolist())
+            template.scan_axes =\
+                Block3D.scan_axes_crossing(int(crossing[first]))
+            coordinates = np.empty((int(cell_counts[first]), 3), np.int64)
+            template.scan_into(coordinates)
+            offsets = np.arange(len(coordinates))
+
+            # Bound the temporary arrays to about scan_batch_cells cells
+            batch_size = max(1, scan_batch_cells // len(coordinates))
+            for batch_start in range(0, len(members), batch_size):
+                batch = members[batch_start:batch_start + batch_size]
+                out[(cell_starts[batch, np.newaxis] + offsets).reshape(-1)] =\
+                    (coordinates + positions[batch, np.newaxis]).reshape(-1, 3)
+        return int(cell_counts.sum())
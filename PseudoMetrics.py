@@ -0,0 +1,318 @@
+"""
+Measure how well curves keep neighbouring cells close together.
+
+Pseudo Hilbert, raster and Z-order (Morton) orderings of the same region are
+compared side by side.  Every ordering is an (N, 2) index_to_coordinate array,
+as built by the 'numpy' backend of PseudoHilbert, and its inverse, a
+(width, height) coordinate_to_index array.
+
+Three kinds of measurements are made
+
+window distance    The Euclidean distance between the first and last cell of
+                   every window of k consecutive indices, averaged and at
+                   most.  Small distances mean cells close in the ordering
+                   are close in space.
+query runs         The number of contiguous index ranges that together
+                   cover a rectangular query window.  Each range is one
+                   sequential read of data stored in curve order.
+cache misses       Data stored in curve order is split into cache lines or
+                   tiles of a fixed number of cells.  Scanning a query window
+                   touches every line holding one of its cells, and each
+                   distinct line is counted as one miss of a cold cache.
+
+    python PseudoMetrics.py 1000 750
+    python PseudoMetrics.py 1000 750 --query 64 64 --line-cells 16
+"""
+import argparse
+import json
+import sys
+
+import PseudoHilbert
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is required by this module but not PseudoHilbert
+    np = None
+
+
+def require_numpy():
+    """Raise an ImportError if NumPy isn't available."""
+    if np is None:
+        raise ImportError('PseudoMetrics requires NumPy')
+
+
+def raster_order(width, height):
+    """Return the cells of a region in raster order, a row at a time.
+
+    Args:
+        width (int): The width of the region
+        height (int): The height of the region
+
+    Returns:
+        (numpy.ndarray): (width * height, 2) array of (x, y) coordinates
+    """
+    require_numpy()
+    y, x = np.divmod(np.arange(width * height, dtype=np.int64), width)
+    return np.stack((x, y), axis=1)
+
+
+def z_order(width, height):
+    """Return the cells of a region in Z-order.
+
+    Cells are sorted by the Morton code formed by interleaving the bits of
+    their coordinates, x in the low bit.  Regions that aren't a power of two
+    square simply skip the codes that fall outside them.
+
+    Args:
+        width (int): The width of the region
+        height (int): The height of the region
+
+    Returns:
+        (numpy.ndarray): (width * height, 2) array of (x, y) coordinates
+    """
+    cells = raster_order(width, height)
+    codes = np.zeros(len(cells), dtype=np.int64)
+    for bit in range(max(width, height).bit_length()):
+        codes |= ((cells[:, 0] >> bit) & 1) << (2 * bit)
+        codes |= ((cells[:, 1] >> bit) & 1) << (2 * bit + 1)
+    return cells[np.argsort(codes, kind='stable')]
+
+
+def pseudo_hilbert_order(width, height):
+    """Return the cells of a region in pseudo Hilbert order.
+
+    Args:
+        width (int): The width of the region
+        height (int): The height of the region
+
+    Returns:
+        (numpy.ndarray): (width * height, 2) array of (x, y) coordinates
+    """
+    require_numpy()
+    curve = PseudoHilbert.PseudoHilbert(width, height, 'numpy')
+    return np.asarray(curve.index_to_coordinate, dtype=np.int64)
+
+
+# Orderings compared by compare, by name
+orderings = {'pseudo_hilbert': pseudo_hilbert_order,
+             'raster': raster_order,
+             'z_order': z_order}
+
+
+def invert(index_to_coordinate, width, height):
+    """Build coordinate_to_index from index_to_coordinate.
+
+    Args:
+        index_to_coordinate (numpy.ndarray): (N, 2) array of (x, y)
+        width (int): The width of the region
+        height (int): The height of the region
+
+    Returns:
+        (numpy.ndarray): (width, height) array of indices
+    """
+    coordinate_to_index = np.empty((width, height), dtype=np.int64)
+    coordinate_to_index[index_to_coordinate[:, 0],
+                        index_to_coordinate[:, 1]] =\
+        np.arange(len(index_to_coordinate))
+    return coordinate_to_index
+
+
+def window_distance(index_to_coordinate, k):
+    """Measure the distance spanned by windows of k consecutive indices.
+
+    Args:
+        index_to_coordinate (numpy.ndarray): (N, 2) array of (x, y)
+        k (int): The number of indices in each window, at least 1
+
+    Returns:
+        (tuple): The average and maximum Euclidean distance between the
+                 first and last cell of each window
+    """
+    if k < 1:
+        raise ValueError('k must be at least 1')
+    if k == 1 or k > len(index_to_coordinate):
+        return 0.0, 0.0
+    difference = (index_to_coordinate[k - 1:] -
+                  index_to_coordinate[:len(index_to_coordinate) - k + 1])
+    distance = np.hypot(difference[:, 0], difference[:, 1])
+    return float(distance.mean()), float(distance.max())
+
+
+def random_windows(width, height, window_width, window_height, count, seed=0):
+    """Choose query windows that lie completely inside a region.
+
+    Args:
+        width (int): The width of the region
+        height (int): The height of the region
+        window_width (int): The width of every window
+        window_height (int): The height of every window
+        count (int): The number of windows
+        seed (int): Seed for the random positions
+
+    Returns:
+        (tuple): Arrays of the x and y position of each window's lower left
+                 cell
+    """
+    if window_width > width or window_height > height:
+        raise ValueError('query windows must fit inside the region')
+    generator = np.random.default_rng(seed)
+    x_start = generator.integers(0, width - window_width + 1, count)
+    y_start = generator.integers(0, height - window_height + 1, count)
+    return x_start, y_start
+
+
+def window_indices(coordinate_to_index, windows, window_width, window_height):
+    """Gather the sorted indices of the cells in each query window.
+
+    Args:
+        coordinate_to_index (numpy.ndarray): (width, height) array of indices
+        windows (tuple): x and y position arrays from random_windows
+        window_width (int): The width of every window
+        window_height (int): The height of every window
+
+    Returns:
+        (numpy.ndarray): (window count, window_width * window_height) array,
+                         each row sorted
+    """
+    x_start, y_start = windows
+    x = x_start[:, None, None] + np.arange(window_width)[None, :, None]
+    y = y_start[:, None, None] + np.arange(window_height)[None, None, :]
+    indices = coordinate_to_index[x, y].reshape(len(x_start), -1)
+    indices.sort(axis=1)
+    return indices
+
+
+def count_distinct(sorted_rows):
+    """Count the distinct values in each row of a row sorted array.
+
+    Args:
+        sorted_rows (numpy.ndarray): 2D array with each row sorted
+
+    Returns:
+        (numpy.ndarray): One count per row
+    """
+    return 1 + np.count_nonzero(np.diff(sorted_rows, axis=1), axis=1)
+
+
+def query_runs(indices):
+    """Count the contiguous index ranges covering each query window.
+
+    Args:
+        indices (numpy.ndarray): Sorted window indices from window_indices
+
+    Returns:
+        (numpy.ndarray): One count per window
+    """
+    return 1 + np.count_nonzero(np.diff(indices, axis=1) != 1, axis=1)
+
+
+def cache_misses(indices, line_cells):
+    """Count the cache lines touched when scanning each query window.
+
+    Args:
+        indices (numpy.ndarray): Sorted window indices from window_indices
+        line_cells (int): The number of cells stored in each line
+
+    Returns:
+        (numpy.ndarray): One count per window
+    """
+    return count_distinct(indices // line_cells)
+
+
+def summarise(values):
+    """Summarise per window measurements.
+
+    Args:
+        values (numpy.ndarray):
+
+    Returns:
+        (dict): The mean and maximum
+    """
+    return {'mean': float(values.mean()), 'max': int(values.max())}
+
+
+def measure(index_to_coordinate, width, height, window_sizes=(2, 16, 256),
+            query=(32, 32), query_count=1000, line_cells=16,
+            tile_cells=4096, seed=0):
+    """Measure the locality of one ordering.
+
+    Args:
+        index_to_coordinate (numpy.ndarray): (N, 2) array of (x, y)
+        width (int): The width of the region
+        height (int): The height of the region
+        window_sizes (tuple): Values of k for window_distance
+        query (tuple): The width and height of the query windows, clipped to
+                       the region
+        query_count (int): The number of random query windows
+        line_cells (int): Cells per cache line
+        tile_cells (int): Cells per tile, or page, of storage
+        seed (int): Seed for the query window positions
+
+    Returns:
+        (dict): Every measurement for the ordering
+    """
+    window_width = min(query[0], width)
+    window_height = min(query[1], height)
+    coordinate_to_index = invert(index_to_coordinate, width, height)
+    windows = random_windows(width, height, window_width, window_height,
+                             query_count, seed)
+    indices = window_indices(coordinate_to_index, windows,
+                             window_width, window_height)
+
+    result = {'window_distance': {}}
+    for k in window_sizes:
+        mean, maximum = window_distance(index_to_coordinate, k)
+        result['window_distance'][k] = {'mean': mean, 'max': maximum}
+    result['query_runs'] = summarise(query_runs(indices))
+    result['line_misses'] = summarise(cache_misses(indices, line_cells))
+    result['tile_misses'] = summarise(cache_misses(indices, tile_cells))
+    return result
+
+
+def compare(width, height, **options):
+    """Measure pseudo Hilbert, raster and Z-order on the same region.
+
+    Every ordering is queried with the same random windows.
+
+    Args:
+        width (int): The width of the region
+        height (int): The height of the region
+        **options: Passed on to measure
+
+    Returns:
+        (dict): Measurements by ordering name
+    """
+    return {name: measure(order(width, height), width, height, **options)
+            for name, order in orderings.items()}
+
+
+def main(arguments=None):
+    """Compare the orderings of one region and print the results as JSON.
+
+    Args:
+        arguments (list): Command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('width', type=int)
+    parser.add_argument('height', type=int)
+    parser.add_argument('--k', type=int, action='append',
+                        help='window size for distances, repeatable')
+    parser.add_argument('--query', type=int, nargs=2, default=(32, 32),
+                        metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--line-cells', type=int, default=16)
+    parser.add_argument('--tile-cells', type=int, default=4096)
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args(arguments)
+
+    results = compare(options.width, options.height,
+                      window_sizes=options.k or (2, 16, 256),
+                      query=options.query, query_count=options.queries,
+                      line_cells=options.line_cells,
+                      tile_cells=options.tile_cells, seed=options.seed)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
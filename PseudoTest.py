@@ -1,41 +1,15 @@
 import PseudoHilbert
 #import time
 #import cProfile
-import svgwrite
-
-
-class Diagram:
-    def __init__(self, width, height):
-        self.width = width
-        self.height = height
-        self.dwg = svgwrite.Drawing(profile='full',
-                                    size=(str(width) + 'px',
-                                          str(height) + 'px'),
-                                    viewBox=('0 0 ' + str(width) +
-                                             ' ' + str(height)))
-        self.dwg.add(self.dwg.rect(insert=(0, 0),
-                                   size=(width, height),
-                                   fill='rgb(255,255,255)'))
 
 rectangle_width = 23
 rectangle_height = 17
 
-diagram = Diagram(rectangle_width, rectangle_height)
-
-PsH = PseudoHilbert.PseudoHilbert(rectangle_width, rectangle_height)
-path = PsH.index_to_coordinate
-coord_adjusted_path = [[coord[0] + 0.5, rectangle_height - coord[1] - 0.5]
-                       for coord in path]
-
-diagram.dwg.add(diagram.dwg.polyline(coord_adjusted_path,
-                                     stroke="rgb(0,0,0)",
-                                     stroke_linejoin='round',
-                                     stroke_width=0.3,
-                                     fill='none'))
-
-diagram.dwg.filename = format(0, '04') + '.svg'
-diagram.dwg.save()
-
+# Streamed a block at a time with collinear cells merged, so only the turns
+# of the curve are written
+with open(format(0, '04') + '.svg', 'w') as svg_file:
+    PseudoHilbert.export_svg(svg_file, rectangle_width, rectangle_height,
+                             stroke_width=0.3)
 
 
 
@@ -0,0 +1,362 @@
+"""
+Check that pseudo Hilbert curve lookup tables describe a valid curve.
+
+A valid curve for a width x height region
+
+starts at (0, 0)     index_to_coordinate[0] is the lower left cell.
+is a permutation     Every cell of the region appears exactly once in
+                     index_to_coordinate.
+is 4-adjacent        Consecutive cells differ by one step in x or y.
+is inverted          coordinate_to_index[x, y] is the index of (x, y) in
+                     index_to_coordinate.
+
+The tables are checked with NumPy a chunk of indices at a time, so tables of
+tens of millions of cells, including ones memory mapped by
+PseudoHilbert.load, are checked without Python loops over cells.  The first
+violation along the curve is reported along with the block that should hold
+it, found with a CurveDescriptor.
+
+    python PseudoValidate.py 1000 750
+    python PseudoValidate.py --file curve.bin
+    python PseudoValidate.py --sweep 200 --max-side 300
+"""
+import argparse
+import random
+import sys
+
+import PseudoHilbert
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is required by this module but not PseudoHilbert
+    np = None
+
+
+def require_numpy():
+    """Raise an ImportError if NumPy isn't available."""
+    if np is None:
+        raise ImportError('PseudoValidate requires NumPy')
+
+
+# Indices checked at a time
+chunk_size = 1 << 20
+
+
+class Violation:
+    """The first place a curve breaks one of the rules.
+
+    Args
+        check (str): 'shape', 'start', 'range', 'permutation', 'adjacency'
+                     or 'inverse', or 'build' when sweep can't build a curve
+        message (str): What is wrong
+        index (int): Position along the curve, None for 'shape'
+        cell (tuple): The (x, y) at index in index_to_coordinate
+
+    Attributes
+        check (str):
+        message (str):
+        index (int):
+        cell (tuple):
+        block (dict): The block of the pseudo Hilbert curve holding index,
+                      see block_context, None for 'shape'
+    """
+
+    def __init__(self, check, message, index=None, cell=None):
+        """Record a violation.
+
+        Args:
+            check (str): The rule that is broken
+            message (str): What is wrong
+            index (int): Position along the curve
+            cell (tuple): The (x, y) at index in index_to_coordinate
+        """
+        self.check = check
+        self.message = message
+        self.index = index
+        self.cell = cell
+        self.block = None
+
+    def __str__(self):
+        """Describe the violation and its block on a few lines."""
+        where = []
+        if self.index is not None:
+            where.append('index ' + str(self.index))
+        if self.cell is not None:
+            where.append('cell ' + str(self.cell))
+        first_line = self.check + ': ' + self.message
+        if where:
+            first_line += ' at ' + ', '.join(where)
+        lines = [first_line]
+        if self.block is not None:
+            lines.append('  in block ' + ', '.join(
+                key + '=' + str(value) for key, value in self.block.items()))
+        return '\n'.join(lines)
+
+
+def block_context(width, height, index):
+    """Describe the block of the pseudo Hilbert curve holding an index.
+
+    Args:
+        width (int): The width of the region
+        height (int): The height of the region
+        index (int): Position along the curve
+
+    Returns:
+        (dict): block_number, hilbert_type, scan_type, shape as the parity
+                of the block's sides, position, size, offset of the index
+                into the block's scan and the cell expected there
+    """
+    descriptor = PseudoHilbert.CurveDescriptor(width, height)
+    block_number, hilbert_type, x_index, y_index, first_index =\
+        descriptor.locate_index(index)
+    block = descriptor.block(block_number, hilbert_type, x_index, y_index)
+    offset = index - first_index
+    return {'block_number': block_number,
+            'hilbert_type': block.hilbert_type,
+            'scan_type': block.scan_type,
+            'shape': tuple(parity.name.lower() for parity in block.shape),
+            'position': (block.x_pos, block.y_pos),
+            'size': (block.x_size, block.y_size),
+            'offset': offset,
+            'expected': tuple(block.offset_to_cell(offset))}
+
+
+def check_chunk(width, height, coordinate_to_index, cells, start, previous,
+                seen):
+    """Check one chunk of index_to_coordinate.
+
+    Args:
+        width (int): The width of the region
+        height (int): The height of the region
+        coordinate_to_index (numpy.ndarray): (width, height) array
+        cells (numpy.ndarray): (n, 2) int64 cells from index start
+        start (int): Index of the first cell of the chunk
+        previous (numpy.ndarray): The cell before the chunk, None for the
+                                  first chunk
+        seen (numpy.ndarray): width * height booleans marking the cells in
+                              earlier chunks, updated in place
+
+    Returns:
+        (Violation): The first violation in the chunk, None if there are
+                     none
+    """
+    x = cells[:, 0]
+    y = cells[:, 1]
+    found = []
+
+    # Cells outside the region can't be looked up, so only the cells before
+    # the first of them are checked further
+    outside = np.flatnonzero((x < 0) | (x >= width) | (y < 0) | (y >= height))
+    if len(outside):
+        found.append(Violation('range', 'cell is outside the ' + str(width) +
+                               ' x ' + str(height) + ' region',
+                               start + int(outside[0])))
+        x = x[:outside[0]]
+        y = y[:outside[0]]
+
+    linear = x * height + y
+    order = np.argsort(linear, kind='stable')
+    sorted_linear = linear[order]
+    repeated = order[1:][sorted_linear[1:] == sorted_linear[:-1]]
+    repeated = np.concatenate((repeated, np.flatnonzero(seen[linear])))
+    if len(repeated):
+        found.append(Violation('permutation', 'cell appears more than once',
+                               start + int(repeated.min())))
+
+    if previous is not None:
+        x_steps = np.diff(x, prepend=previous[0])
+        y_steps = np.diff(y, prepend=previous[1])
+        first = 0
+    else:
+        x_steps = np.diff(x)
+        y_steps = np.diff(y)
+        first = 1
+    apart = np.flatnonzero(np.abs(x_steps) + np.abs(y_steps) != 1)
+    if len(apart):
+        found.append(Violation('adjacency',
+                               'cell is not 4-adjacent to the one before',
+                               start + first + int(apart[0])))
+
+    wrong = np.flatnonzero(coordinate_to_index[x, y] !=
+                           np.arange(start, start + len(x)))
+    if len(wrong):
+        index = start + int(wrong[0])
+        found.append(Violation(
+            'inverse', 'coordinate_to_index holds ' +
+            str(int(coordinate_to_index[x[wrong[0]], y[wrong[0]]])), index))
+
+    seen[linear] = True
+    if not found:
+        return None
+    violation = min(found, key=lambda violation: violation.index)
+    violation.cell = tuple(int(value) for value in
+                           cells[violation.index - start])
+    return violation
+
+
+def validate(width, height, coordinate_to_index, index_to_coordinate,
+             chunk_size=chunk_size):
+    """Check lookup tables a chunk of indices at a time.
+
+    Args:
+        width (int): The width of the region
+        height (int): The height of the region
+        coordinate_to_index (array like): (width, height) table
+        index_to_coordinate (array like): (width * height, 2) table
+        chunk_size (int): Indices checked at a time
+
+    Returns:
+        (Violation): The first violation along the curve, with its block,
+                     or None if the tables are valid
+    """
+    require_numpy()
+    coordinate_to_index = np.asarray(coordinate_to_index)
+    index_to_coordinate = np.asarray(index_to_coordinate)
+    cell_count = width * height
+    if coordinate_to_index.shape != (width, height):
+        return Violation('shape', 'coordinate_to_index has shape ' +
+                         str(coordinate_to_index.shape))
+    if index_to_coordinate.shape != (cell_count, 2):
+        return Violation('shape', 'index_to_coordinate has shape ' +
+                         str(index_to_coordinate.shape))
+
+    violation = None
+    if tuple(index_to_coordinate[0]) != (0, 0):
+        violation = Violation('start', 'curve does not start at (0, 0)', 0,
+                              tuple(int(value) for value in
+                                    index_to_coordinate[0]))
+
+    seen = np.zeros(cell_count, bool)
+    previous = None
+    for start in range(0, cell_count, chunk_size):
+        if violation is not None:
+            break
+        cells = index_to_coordinate[start:start + chunk_size].astype(
+            np.int64)
+        violation = check_chunk(width, height, coordinate_to_index, cells,
+                                start, previous, seen)
+        previous = cells[-1]
+
+    if violation is not None:
+        violation.block = block_context(width, height, violation.index)
+    return violation
+
+
+def validate_curve(curve, chunk_size=chunk_size):
+    """Check the lookup tables of a curve.
+
+    Args:
+        curve (PseudoHilbert.PseudoHilbert): Built with any backend
+        chunk_size (int): Indices checked at a time
+
+    Returns:
+        (Violation): The first violation, or None if the curve is valid
+    """
+    return validate(curve.width, curve.height, curve.coordinate_to_index,
+                    curve.index_to_coordinate, chunk_size)
+
+
+def random_shapes(count, max_side, seed=0):
+    """Choose region shapes covering every combination of odd and even sides.
+
+    Args:
+        count (int): The number of shapes
+        max_side (int): The longest side
+        seed (int): Seed for the random sides
+
+    Returns:
+        (list): (width, height) pairs, cycling through odd x odd, odd x even,
+                even x odd and even x even
+    """
+    generator = random.Random(seed)
+    shapes = []
+    for number in range(count):
+        sides = []
+        for odd in ((number >> 1) & 1 == 0, number & 1 == 0):
+            half = generator.randint(1, max(max_side // 2, 1))
+            sides.append(2 * half - 1 if odd else 2 * half)
+        shapes.append(tuple(sides))
+    return shapes
+
+
+def sweep(count=100, max_side=300, seed=0, backends=None):
+    """Build and check curves of random shapes with several backends.
+
+    Args:
+        count (int): The number of random shapes
+        max_side (int): The longest side
+        seed (int): Seed for the random shapes
+        backends (tuple): Backends to build with, defaults to every backend
+                          available, with 'list' only for shapes of at most
+                          10,000 cells
+
+    Returns:
+        (list): (width, height, backend, Violation) for every curve that
+                fails, building errors are reported as 'build' violations
+    """
+    require_numpy()
+    failures = []
+    for width, height in random_shapes(count, max_side, seed):
+        for backend in backends or PseudoHilbert.PseudoHilbert.backends:
+            if backends is None and backend == 'list' and\
+                    width * height > 10000:
+                continue
+            try:
+                curve = PseudoHilbert.PseudoHilbert(width, height, backend)
+            except Exception as error:
+                failures.append((width, height, backend,
+                                 Violation('build', repr(error))))
+                continue
+            violation = validate_curve(curve)
+            if violation is not None:
+                failures.append((width, height, backend, violation))
+    return failures
+
+
+def main(arguments=None):
+    """Check one curve, a saved curve or a sweep of random shapes.
+
+    Args:
+        arguments (list): Command line arguments, defaults to sys.argv
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('width', type=int, nargs='?')
+    parser.add_argument('height', type=int, nargs='?')
+    parser.add_argument('--backend', default=None,
+                        choices=PseudoHilbert.PseudoHilbert.backends)
+    parser.add_argument('--file', help='check a curve written by save')
+    parser.add_argument('--sweep', type=int, metavar='COUNT',
+                        help='check this many random shapes')
+    parser.add_argument('--max-side', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=chunk_size)
+    options = parser.parse_args(arguments)
+
+    if options.sweep is not None:
+        backends = None if options.backend is None else (options.backend,)
+        failures = sweep(options.sweep, options.max_side, options.seed,
+                         backends)
+        for width, height, backend, violation in failures:
+            print(width, 'x', height, backend, violation)
+        print(options.sweep, 'shapes,', len(failures), 'failures')
+        return 1 if failures else 0
+
+    if options.file:
+        curve = PseudoHilbert.PseudoHilbert.load(options.file)
+    elif options.width is not None and options.height is not None:
+        curve = PseudoHilbert.PseudoHilbert(
+            options.width, options.height,
+            options.backend or PseudoHilbert.fastest_backend())
+    else:
+        parser.error('give a width and height, --file or --sweep')
+
+    violation = validate_curve(curve, options.chunk_size)
+    if violation is None:
+        print(curve.width, 'x', curve.height, 'is valid')
+        return 0
+    print(violation)
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())